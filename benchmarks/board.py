@@ -0,0 +1,184 @@
+import random
+import time
+
+from contextlib import contextmanager
+
+from saas.board import Board
+from saas.constants import SPAWN_STRATEGY_STATIC
+from saas.engine import Engine, get_safe_moves, random_bot
+from saas.patch import get_move_request
+
+API_VERSIONS = ["2016", "2017", "2018", "client"]
+
+SIZES = [(11, 11), (19, 19), (50, 50), (100, 100), (200, 200)]
+SNAKE_COUNTS = [2, 8, 20, 50]
+
+
+class Timer(object):
+    # only what runs inside `measure` counts, setup between measurements is free
+    def __init__(self, budget):
+        self.budget = budget
+        self.elapsed = 0
+        self.count = 0
+
+    @property
+    def done(self):
+        return self.elapsed >= self.budget
+
+    @contextmanager
+    def measure(self):
+        started_at = time.perf_counter()
+
+        try: yield
+        finally:
+            self.elapsed = self.elapsed + time.perf_counter() - started_at
+            self.count = self.count + 1
+
+
+def create_engine(width, height, snakes):
+    bots = { "snake-{}".format(index): random_bot for index in range(0, snakes) }
+    return Engine(bots, width=width, height=height, rules={ "boardFoodCount": max(4, width * height // 100) })
+
+
+def set_moves(engine):
+    for snake_id, snake in engine.board.get_snakes().items():
+        if snake.length: snake.next_move = random.choice(get_safe_moves(engine.board, snake) or [snake.next_move])
+
+
+def bench_update(timer, width, height, snakes):
+    while not timer.done:
+        engine = create_engine(width, height, snakes)
+
+        # a fresh board every so often, dead snakes keep growing off the board otherwise
+        for _ in range(0, 50):
+            if timer.done or engine.is_finished(): break
+
+            set_moves(engine)
+
+            with timer.measure():
+                engine.board.update(engine, engine.board.get_snakes(), tick_snakes=True)
+
+            engine.turn_number = engine.turn_number + 1
+
+
+def bench_get_at_position(timer, width, height, snakes):
+    board = create_engine(width, height, snakes).board
+    positions = [ (random.randrange(0, width), random.randrange(0, height)) for _ in range(0, 1000) ]
+
+    while not timer.done:
+        x, y = random.choice(positions)
+
+        with timer.measure():
+            board.get_at_position(x, y)
+
+
+def bench_get_random_empty_position(timer, width, height, snakes):
+    board = create_engine(width, height, snakes).board
+
+    while not timer.done:
+        with timer.measure():
+            board.get_random_empty_position()
+
+
+def bench_initialize_snakes(timer, width, height, snakes):
+    board = create_engine(width, height, snakes).board
+
+    while not timer.done:
+        with timer.measure():
+            board.initialize_snakes()
+
+
+def create_spawn_bench(spawn, count):
+    def bench(timer, width, height, snakes):
+        while not timer.done:
+            board = create_engine(width, height, snakes).board
+
+            for _ in range(0, 20):
+                if timer.done: break
+
+                with timer.measure():
+                    getattr(board, spawn)(count)
+
+    return bench
+
+
+def bench_static_food(timer, width, height, snakes):
+    # a board configuration with hidden food on every other cell, the static strategy reveals
+    # one and a snake eats it again. reveals and eats are timed as separate operations
+    engine = create_engine(width, height, snakes)
+    board = Board(engine.board.get_snakes(), configuration={
+        "boardColumns": width, "boardRows": height, "snakes": [], "gold": [], "teleporters": [], "walls": [],
+        "food": [ { "x": x, "y": y, "hidden": True } for x in range(0, width) for y in range(x % 2, height, 2) ]
+    })
+
+    while not timer.done:
+        with timer.measure():
+            board.spawn_food_by_strat(SPAWN_STRATEGY_STATIC)
+
+        # nothing is revealed under a snake
+        food = next(iter([ food for food in board.food if not food["hidden"] ]), None)
+        if food is None: continue
+
+        with timer.measure():
+            board.food.remove(food)
+            board._vacate(food["x"], food["y"], Board.BOARD_TYPE_FOOD, food)
+
+
+def create_to_json_bench(api_version):
+    def bench(timer, width, height, snakes):
+        board = create_engine(width, height, snakes).board
+
+        while not timer.done:
+            # serialized boards are cached until the board changes, which it does every turn
+            board.touch()
+
+            with timer.measure():
+                board.to_json(api_version=api_version)
+
+    return bench
+
+
+def create_move_request_bench(api_version):
+    def bench(timer, width, height, snakes):
+        engine = create_engine(width, height, snakes)
+        snake_list = [ snake for snake_id, snake in engine.board.get_snakes().items() ]
+
+        for snake in snake_list:
+            snake._api_version = api_version
+
+        while not timer.done:
+            engine.board.touch()
+
+            # one request per snake per turn, the board is only serialized for the first
+            with timer.measure():
+                for snake in snake_list:
+                    get_move_request(engine.board, engine, snake)
+
+    return bench
+
+
+BENCHMARKS = [
+    ("update", bench_update),
+    ("get_at_position", bench_get_at_position),
+    ("get_random_empty_position", bench_get_random_empty_position),
+    ("initialize_snakes", bench_initialize_snakes),
+    ("spawn_random_food", create_spawn_bench("spawn_random_food", 5)),
+    ("spawn_random_gold", create_spawn_bench("spawn_random_gold", 5)),
+    ("spawn_random_teleporters", create_spawn_bench("spawn_random_teleporters", 2)),
+    ("spawn_random_walls", create_spawn_bench("spawn_random_walls", 5)),
+    ("static_food", bench_static_food)
+]
+
+BENCHMARKS.extend([ ("to_json/{}".format(api_version), create_to_json_bench(api_version)) for api_version in API_VERSIONS ])
+BENCHMARKS.extend([ ("get_move_request/{}".format(api_version), create_move_request_bench(api_version)) for api_version in API_VERSIONS ])
+
+
+def get_cases(sizes=SIZES, snake_counts=SNAKE_COUNTS):
+    # boards where the snakes would take up more than half of the cells are skipped
+    return [
+        (name, bench, width, height, snakes)
+        for name, bench in BENCHMARKS
+        for width, height in sizes
+        for snakes in snake_counts
+        if snakes * 3 * 2 <= width * height
+    ]
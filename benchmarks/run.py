@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+# keeps saas/__init__.py from setting up flask, postgres, redis...
+os.environ["HEADLESS"] = "1"
+
+from benchmarks.board import SIZES, SNAKE_COUNTS, Timer, get_cases
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="benchmark the board engine and serializers")
+    parser.add_argument("--filter", help="only run benchmarks whose key matches this regex")
+    parser.add_argument("--quick", action="store_true", help="only the smallest and a medium board, 2 and 8 snakes")
+    parser.add_argument("--budget", type=float, default=0.1, help="seconds of measured time per repeat")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results as a json baseline")
+    parser.add_argument("--compare", help="compare against a json baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown that counts as a regression (0.10 is 10%%)")
+
+    return parser.parse_args()
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode("utf-8").strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args):
+    sizes = [SIZES[0], SIZES[2]] if args.quick else SIZES
+    snake_counts = SNAKE_COUNTS[:2] if args.quick else SNAKE_COUNTS
+    results = { }
+
+    for name, bench, width, height, snakes in get_cases(sizes, snake_counts):
+        key = "{}/{}x{}/{}".format(name, width, height, snakes)
+        if args.filter and not re.search(args.filter, key): continue
+
+        timings = []
+        count = 0
+
+        for repeat in range(0, args.repeat):
+            random.seed(args.seed + repeat)
+
+            timer = Timer(args.budget)
+            bench(timer, width, height, snakes)
+
+            timings.append(timer.elapsed / timer.count)
+            count = count + timer.count
+
+        results[key] = { "min": min(timings), "median": statistics.median(timings), "count": count }
+        print("{:<50} {:>12} {:>12}".format(key, format_time(min(timings)), format_time(statistics.median(timings))))
+        sys.stdout.flush()
+
+    return results
+
+
+def format_time(seconds):
+    for unit, scale in [("s", 1), ("ms", 1e-3), ("us", 1e-6)]:
+        if seconds >= scale: return "{:.2f}{}".format(seconds / scale, unit)
+
+    return "{:.0f}ns".format(seconds / 1e-9)
+
+
+def compare(results, baseline, threshold):
+    # min times are compared, they're the least noisy
+    regressions = []
+
+    print()
+    print("{:<50} {:>12} {:>12} {:>8}".format("", "baseline", "now", "change"))
+
+    for key, result in results.items():
+        if key not in baseline["results"]: continue
+
+        before = baseline["results"][key]["min"]
+        change = result["min"] / before - 1 if before else 0
+
+        flag = ""
+        if change > threshold:
+            flag = " slower"
+            regressions.append(key)
+        elif change < -threshold:
+            flag = " faster"
+
+        print("{:<50} {:>12} {:>12} {:>+7.1f}%{}".format(key, format_time(before), format_time(result["min"]), change * 100, flag))
+
+    return regressions
+
+
+def main():
+    args = parse_args()
+
+    print("{:<50} {:>12} {:>12}".format("", "min", "median"))
+    results = run_benchmarks(args)
+
+    data = {
+        "meta": {
+            "commit": get_commit(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "budget": args.budget,
+            "repeat": args.repeat,
+            "seed": args.seed
+        },
+        "results": results
+    }
+
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump(data, baseline_file, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = compare(results, baseline, args.threshold)
+
+        if regressions:
+            print()
+            print("{} regression(s) over {:.0f}%".format(len(regressions), args.threshold * 100))
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
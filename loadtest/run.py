@@ -0,0 +1,286 @@
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from loadtest import standins
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="play games against stub snakes with simulated spectators")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--snakes", type=int, default=4)
+    parser.add_argument("--watchers", type=int, default=5, help="spectators per game")
+    parser.add_argument("--format", default="json", help="stream the spectators watch (json, delta, binary)")
+    parser.add_argument("--width", type=int, default=11)
+    parser.add_argument("--height", type=int, default=11)
+    parser.add_argument("--tick-rate", type=int, default=100, help="ms between turns")
+    parser.add_argument("--response-time", type=float, default=0.2, help="seconds snakes get to answer")
+    parser.add_argument("--duration", type=float, default=30, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds played before measuring")
+    parser.add_argument("--daemon", action="store_true", help="give every game the stub daemon")
+    parser.add_argument("--port", type=int, default=9100, help="first port of the stub servers")
+    parser.add_argument("--latency", type=float, default=20, help="median snake /move latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.5, help="sigma of the lognormal latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of /move requests that fail")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of /move requests that time out")
+    parser.add_argument("--save", help="write the report as json")
+
+    return parser.parse_args()
+
+
+class Recorder(object):
+    def __init__(self):
+        from saas.metrics import LatencyHistogram
+
+        self.emit_latency = LatencyHistogram()
+        self.tick_lag = LatencyHistogram()
+        self.frames = 0
+        self.measuring = False
+
+        self.emitting = { } # game_id -> when the turn being emitted started serializing
+
+    def reset(self):
+        self.__init__()
+        self.measuring = True
+
+
+class Spectator(list):
+    # stands in for the test client's message queue, turn frames are timed as they arrive
+    # instead of being kept around
+    def __init__(self, recorder, game_id):
+        list.__init__(self)
+
+        self.recorder = recorder
+        self.game_id = game_id
+
+    def append(self, message):
+        started_at = self.recorder.emitting.get(self.game_id)
+
+        if message["name"] == "update" and started_at is not None and self.recorder.measuring:
+            self.recorder.emit_latency.record(time.time() - started_at)
+            self.recorder.frames = self.recorder.frames + 1
+
+
+def instrument(Game, recorder):
+    update_clients = Game.update_clients
+    step_game = Game.step_game
+
+    def timed_update_clients(game, errors=None):
+        # only turns pass errors, frames sent for joins and leaves aren't timed
+        if errors is None: return update_clients(game, errors)
+
+        recorder.emitting[game.game_id] = time.time()
+
+        try: return update_clients(game, errors)
+        finally: recorder.emitting.pop(game.game_id, None)
+
+    def timed_step_game(game, allow_stepping=False):
+        on_tick = allow_stepping and game.next_tick_at is not None
+
+        try: return step_game(game, allow_stepping)
+        finally:
+            if on_tick and recorder.measuring: recorder.tick_lag.record(game.tick_lag)
+
+    Game.update_clients = timed_update_clients
+    Game.step_game = timed_step_game
+
+
+def start_stubs(args):
+    stubs = subprocess.Popen([
+        sys.executable, "-m", "loadtest.stubs",
+        "--port", str(args.port),
+        "--snakes", str(args.snakes),
+        "--latency", str(args.latency),
+        "--jitter", str(args.jitter),
+        "--error-rate", str(args.error_rate),
+        "--timeout-rate", str(args.timeout_rate),
+        "--timeout-after", str(args.response_time * 2)
+    ])
+
+    for attempt in range(0, 100):
+        try:
+            socket.create_connection(("127.0.0.1", args.port + args.snakes), timeout=1).close()
+            return stubs
+        except OSError:
+            time.sleep(0.1)
+
+    stubs.kill()
+    raise Exception("stub servers didn't start on port {}".format(args.port))
+
+
+def get_cpu_time(process=None):
+    if process is None: return time.process_time()
+
+    # utime + stime of a child that is still running
+    with open("/proc/{}/stat".format(process.pid)) as stat:
+        fields = stat.read().rsplit(")", 1)[1].split()
+
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def run(args, stubs):
+    database = standins.LocalDatabase()
+
+    snake_urls = ["http://127.0.0.1:{}".format(args.port + index) for index in range(0, args.snakes)]
+    daemon = { }
+
+    if args.daemon:
+        daemon = {
+            "daemon_id": "stub-daemon",
+            "daemon_name": "stub-daemon",
+            "daemon_url": "http://127.0.0.1:{}".format(args.port + args.snakes)
+        }
+
+    for index in range(0, args.games):
+        database.add_game(*standins.create_game(
+            snake_urls,
+            boardColumns=args.width,
+            boardRows=args.height,
+            tickRate=args.tick_rate,
+            responseTime=args.response_time,
+            **daemon
+        ))
+
+    standins.install(database)
+
+    import saas
+    from saas.game import Game
+
+    recorder = Recorder()
+    instrument(Game, recorder)
+
+    spectators = { }
+
+    for game_id in database.games:
+        spectators[game_id] = []
+
+        for index in range(0, args.watchers):
+            client = saas.socketio.test_client(saas.app)
+            client.queue = Spectator(recorder, game_id)
+            client.emit("watch", { "gameId": game_id, "format": args.format })
+
+            spectators[game_id].append(client)
+
+    # the first spectator of every game switches it to auto mode, like someone pressing `e`
+    for game_id, clients in spectators.items():
+        clients[0].emit("keyboard_event", { "key": "e" })
+
+    time.sleep(args.warmup)
+
+    games = saas.manager.get_games()
+
+    turns_before = { game_id: game.turn_number for game_id, game in games.items() }
+    overruns_before = { game_id: game.tick_overruns for game_id, game in games.items() }
+    cpu_before = get_cpu_time()
+    stubs_cpu_before = get_cpu_time(stubs) if sys.platform.startswith("linux") else None
+    started_at = time.time()
+
+    recorder.reset()
+    saas.metrics.phases.clear()
+    time.sleep(args.duration)
+
+    recorder.measuring = False
+    elapsed = time.time() - started_at
+    cpu = get_cpu_time() - cpu_before
+    stubs_cpu = get_cpu_time(stubs) - stubs_cpu_before if stubs_cpu_before is not None else None
+
+    turns = { game_id: game.turn_number - turns_before.get(game_id, 0) for game_id, game in games.items() }
+    overruns = sum([ game.tick_overruns - overruns_before.get(game_id, 0) for game_id, game in games.items() ])
+
+    for game_id, clients in spectators.items():
+        clients[0].emit("keyboard_event", { "key": "e" })
+        for client in clients: client.disconnect()
+
+    total_turns = sum(turns.values())
+    turns_per_second = [ count / elapsed for game_id, count in turns.items() ]
+
+    return {
+        "config": vars(args),
+        "elapsed": elapsed,
+        "turns": total_turns,
+        "turns_per_second": total_turns / elapsed,
+        "target_turns_per_second": len(games) * 1000 / args.tick_rate,
+        "slowest_game_turns_per_second": min(turns_per_second) if turns_per_second else 0,
+        "tick_lag": recorder.tick_lag.to_json(),
+        "tick_overruns": overruns,
+        "emit_latency": recorder.emit_latency.to_json(),
+        "frames": recorder.frames,
+        "cpu": cpu,
+        "cpu_per_game": cpu / elapsed / max(len(games), 1),
+        "cpu_per_turn": cpu / total_turns if total_turns else None,
+        "stubs_cpu": stubs_cpu,
+        "phases": { phase: histogram.to_json() for phase, histogram in saas.metrics.phases.items() },
+        "snake_latency": saas.metrics.get_stats().get("snake", { })
+    }
+
+
+def format_ms(seconds):
+    return "-" if seconds is None else "{:.2f}ms".format(seconds * 1000)
+
+
+def format_histogram(histogram):
+    return "p50 {} p95 {} p99 {} max {}".format(*[
+        format_ms(histogram[key]) for key in ["p50", "p95", "p99", "max"]
+    ])
+
+
+def print_report(report):
+    config = report["config"]
+
+    print()
+    print("{} games, {} snakes, {} {} spectators each, {}ms ticks, {:.1f}s measured".format(
+        config["games"], config["snakes"], config["watchers"], config["format"], config["tick_rate"], report["elapsed"]
+    ))
+    print()
+    print("turns/s         {:.1f} of {:.1f} ({:.1f} for the slowest game)".format(
+        report["turns_per_second"], report["target_turns_per_second"], report["slowest_game_turns_per_second"]
+    ))
+    print("tick lag        {}".format(format_histogram(report["tick_lag"])))
+    print("tick overruns   {}".format(report["tick_overruns"]))
+    print("emit latency    {} ({} frames)".format(format_histogram(report["emit_latency"]), report["frames"]))
+    print("cpu per game    {:.1f}% of a core, {} per turn".format(report["cpu_per_game"] * 100, format_ms(report["cpu_per_turn"])))
+
+    if report["stubs_cpu"] is not None:
+        print("stubs cpu       {:.1f}% of a core (not included above)".format(report["stubs_cpu"] / report["elapsed"] * 100))
+
+    print()
+
+    for phase, histogram in sorted(report["phases"].items()):
+        print("{:<15} {}".format(phase, format_histogram(histogram)))
+
+    print()
+
+    for url, histogram in sorted(report["snake_latency"].items()):
+        print("{:<30} {}".format(url, format_histogram(histogram)))
+
+
+def main():
+    args = parse_args()
+
+    # nothing gets written next to the service's own replays
+    os.environ.setdefault("REPLAY_DIR", tempfile.mkdtemp(prefix="saas-loadtest-"))
+    # every game talks to the same handful of stub origins, production spreads them out
+    os.environ.setdefault("HTTP_POOL_MAXSIZE", str(max(10, args.games)))
+
+    stubs = start_stubs(args)
+
+    try: report = run(args, stubs)
+    finally: stubs.kill()
+
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w") as output:
+            json.dump(report, output, indent=4, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
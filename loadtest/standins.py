@@ -0,0 +1,278 @@
+import sys
+import types
+import uuid
+
+from collections import defaultdict
+from contextlib import contextmanager
+from queue import Queue
+from threading import Lock
+
+import redis
+
+
+class LocalDatabase(object):
+    # the rows saas/queries.py reads and writes, kept in memory. statements are matched on a
+    # fragment of their sql, anything not in STATEMENTS fails loudly so new queries get noticed
+    STATEMENTS = [
+        ('INSERT INTO "public"."GameTurns"', "insert_game_turn"),
+        ('DELETE FROM "public"."GameTurns"', "delete_game_turns"),
+        ('SET "history"', "set_game_history"),
+        ('SET "status"', "set_game_status"),
+        ('UPDATE "public"."SnakeGames"', "set_snake_places"),
+        ('LEFT JOIN "public"."Daemons"', "get_game"),
+        ('FROM "public"."Snakes"', "get_game_snakes"),
+        ('WHERE "parentGameId" = $1', "get_child_games"),
+        ('INSERT INTO "public"."Games"', "clone_game"),
+        ('INSERT INTO "public"."SnakeGames"', "clone_snake_games")
+    ]
+
+    def __init__(self):
+        self.games = { } # game_id -> row
+        self.snakes = { } # game_id -> [row]
+        self.places = { } # (game_id, snake_id) -> place
+        self.turns = defaultdict(int) # game_id -> turns written
+        self.turn_bytes = 0
+        self.status_writes = 0
+
+        self._listeners = defaultdict(list) # channel -> [Queue]
+        self._lock = Lock()
+
+    def add_game(self, game, snakes):
+        self.games[game["id"]] = game
+        self.snakes[game["id"]] = snakes
+
+    def get_handler(self, sql):
+        for fragment, name in LocalDatabase.STATEMENTS:
+            if fragment in sql: return getattr(self, name)
+
+        raise ValueError("no stand-in for statement: {}".format(" ".join(sql.split())[:80]))
+
+    def listen(self, channel):
+        notifications = Queue()
+
+        with self._lock: self._listeners[channel].append(notifications)
+
+        return notifications
+
+    def notify(self, channel, payload):
+        with self._lock: listeners = list(self._listeners[channel])
+
+        for notifications in listeners:
+            notifications.put((channel, payload, 0))
+
+    def clone_game(self, new_id, game_id):
+        game = dict(self.games[game_id], id=str(new_id), parentGameId=game_id, status="CREATED")
+        self.games[game["id"]] = game
+
+        return [game]
+
+    def clone_snake_games(self, new_id, game_id):
+        self.snakes[str(new_id)] = list(self.snakes[game_id])
+
+    def delete_game_turns(self, game_id):
+        self.turns.pop(game_id, None)
+
+    def get_child_games(self, game_id):
+        return [game for game in self.games.values() if game.get("parentGameId") == game_id]
+
+    def get_game(self, game_id):
+        game = self.games.get(game_id)
+        return [game] if game else []
+
+    def get_game_snakes(self, game_id):
+        return self.snakes.get(game_id, [])
+
+    def insert_game_turn(self, game_id, turn, board):
+        self.turns[game_id] = self.turns[game_id] + 1
+        self.turn_bytes = self.turn_bytes + len(board)
+
+    def set_game_history(self, history, game_id):
+        pass
+
+    def set_game_status(self, status, game_id):
+        self.status_writes = self.status_writes + 1
+        if game_id in self.games: self.games[game_id]["status"] = status
+
+    def set_snake_places(self, snake_ids, places, game_id):
+        for snake_id, place in zip(snake_ids, places):
+            self.places[(game_id, snake_id)] = place
+
+
+class LocalStatement(object):
+    def __init__(self, handler):
+        self.handler = handler
+
+    def __call__(self, *args):
+        return self.handler(*args)
+
+    def column(self, *args):
+        return [list(row.values())[0] for row in self.handler(*args) or []]
+
+    def first(self, *args):
+        rows = self.handler(*args)
+        return rows[0] if rows else None
+
+    def load_rows(self, rows):
+        for row in rows: self.handler(*row)
+
+    def rows(self, *args):
+        return iter(self.handler(*args) or [])
+
+
+class LocalConnection(object):
+    # what saas uses of a py-postgresql connection
+    def __init__(self, database):
+        self.database = database
+        self.closed = False
+
+        self._notifications = None
+
+    def close(self):
+        self.closed = True
+
+    def iternotifies(self):
+        while not self.closed:
+            yield self._notifications.get()
+
+    def listen(self, channel):
+        self._notifications = self.database.listen(channel)
+
+    def prepare(self, sql):
+        return LocalStatement(self.database.get_handler(sql))
+
+    @contextmanager
+    def xact(self):
+        yield
+
+
+class LocalScript(object):
+    def __init__(self, local_redis, function):
+        self.redis = local_redis
+        self.function = function
+
+    def __call__(self, keys=[], args=[], client=None):
+        if isinstance(client, LocalPipeline):
+            client.calls.append((self.function, (keys, args)))
+            return client
+
+        with self.redis.lock:
+            return self.function(keys, args)
+
+
+class LocalPipeline(object):
+    def __init__(self, local_redis):
+        self.redis = local_redis
+        self.calls = []
+
+    def execute(self):
+        calls, self.calls = self.calls, []
+
+        with self.redis.lock:
+            return [function(*args) for function, args in calls]
+
+    def __getattr__(self, name):
+        function = getattr(self.redis, "_{}".format(name))
+
+        def queue(*args):
+            self.calls.append((function, args))
+            return self
+
+        return queue
+
+
+class LocalRedis(object):
+    # the handful of commands saas sends, with redis-py 2.x argument orders
+    def __init__(self, **kwargs):
+        self.values = { }
+        self.hashes = defaultdict(lambda: defaultdict(int))
+        self.sorted_sets = defaultdict(lambda: defaultdict(float))
+        self.commands = 0
+
+        self.lock = Lock()
+
+    def get(self, name):
+        with self.lock: return self._get(name)
+
+    def set(self, name, value):
+        with self.lock: return self._set(name, value)
+
+    def pipeline(self, transaction=True):
+        return LocalPipeline(self)
+
+    def register_script(self, script):
+        # imported late, saas is half way through being imported when the scripts get registered
+        from saas.viewers import SYNC_VIEWER_COUNT_SCRIPT
+
+        scripts = { SYNC_VIEWER_COUNT_SCRIPT: self._sync_viewer_count }
+
+        if script not in scripts: raise ValueError("no stand-in for script: {}".format(script.strip()[:80]))
+
+        return LocalScript(self, scripts[script])
+
+    def _get(self, name):
+        self.commands = self.commands + 1
+        return self.values.get(name)
+
+    def _hincrby(self, name, key, amount=1):
+        self.commands = self.commands + 1
+        self.hashes[name][key] = self.hashes[name][key] + int(amount)
+
+        return self.hashes[name][key]
+
+    def _hincrbyfloat(self, name, key, amount=1.0):
+        self.commands = self.commands + 1
+        self.hashes[name][key] = self.hashes[name][key] + float(amount)
+
+        return self.hashes[name][key]
+
+    def _set(self, name, value):
+        self.commands = self.commands + 1
+        self.values[name] = str(value)
+
+        return True
+
+    def _sync_viewer_count(self, keys, args):
+        self.commands = self.commands + 1
+        self.values[keys[0]] = str(args[0])
+
+        if int(args[1]) > int(self.values.get(keys[1]) or 0):
+            self.values[keys[1]] = str(args[1])
+
+    def _zincrby(self, name, value, amount=1):
+        self.commands = self.commands + 1
+        self.sorted_sets[name][value] = self.sorted_sets[name][value] + float(amount)
+
+        return self.sorted_sets[name][value]
+
+
+def create_game(snakes, **columns):
+    game = {
+        "id": str(uuid.uuid4()), "boardFoodCount": 4, "boardFoodStrategy": "RANDOM",
+        "boardGoldCount": 0, "boardGoldStrategy": "RANDOM", "pinTail": False,
+        "boardGoldWinningThreshold": 5, "boardGoldRespawnInterval": 0, "boardHasGold": False, "boardHasWalls": False,
+        "boardHasTeleporters": False, "boardRows": 11, "boardColumns": 11, "boardTeleporterCount": 0,
+        "creatorId": str(uuid.uuid4()), "devMode": False, "status": "CREATED", "tickRate": 100, "turnLimit": 0,
+        "responseTime": 0.2, "gameType": "TYPE_PLACEMENT", "daemon_id": None, "daemon_name": None, "daemon_url": None,
+        "board_configuration_id": None, "board_configuration": None, "board_configuration_name": None
+    }
+
+    game.update(columns)
+
+    return game, [create_snake(index, url) for index, url in enumerate(snakes)]
+
+
+def create_snake(index, url):
+    return {
+        "id": str(uuid.uuid4()), "defaultColor": "#{:06x}".format((index * 0x3f7b21) % 0xffffff), "headImage": None,
+        "headImageUrl": None, "isBountySnake": False, "api_version": "2018", "name": "stub-{}".format(index),
+        "url": url, "devUrl": url
+    }
+
+
+def install(database):
+    # has to run before saas is imported, saas/__init__.py connects to both right away
+    postgresql = types.ModuleType("postgresql")
+    postgresql.open = lambda **kwargs: LocalConnection(database)
+
+    sys.modules["postgresql"] = postgresql
+    redis.StrictRedis = LocalRedis
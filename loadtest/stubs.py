@@ -0,0 +1,139 @@
+from gevent import monkey
+monkey.patch_all()
+
+import argparse
+import json
+import math
+import random
+import sys
+
+import gevent
+
+from gevent.pywsgi import WSGIServer
+
+MOVES = { "up": (0, -1), "down": (0, 1), "left": (-1, 0), "right": (1, 0) }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="stub snake servers and a stub daemon for the load generator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100, help="snake N listens on port + N, the daemon on port + snakes")
+    parser.add_argument("--snakes", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=20, help="median /move latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.5, help="sigma of the lognormal latency distribution")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of /move requests answered with a 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of /move requests answered after --timeout-after")
+    parser.add_argument("--timeout-after", type=float, default=1.0, help="seconds")
+    parser.add_argument("--daemon-latency", type=float, default=5, help="median daemon latency in ms")
+
+    return parser.parse_args()
+
+
+class Latency(object):
+    def __init__(self, median, jitter, error_rate=0.0, timeout_rate=0.0, timeout_after=1.0):
+        self.median = median / 1000
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_after = timeout_after
+
+    def wait(self):
+        # returns False when the request should fail
+        roll = random.random()
+
+        if roll < self.timeout_rate:
+            gevent.sleep(self.timeout_after)
+            return True
+
+        if self.median > 0:
+            gevent.sleep(random.lognormvariate(math.log(self.median), self.jitter) if self.jitter else self.median)
+
+        return roll >= self.timeout_rate + self.error_rate
+
+
+def get_safe_move(request):
+    # 2018 api, avoids walls and every body, anything is fine when there's nowhere to go
+    head = request["you"]["body"]["data"][0]
+    occupied = set([
+        (coord["x"], coord["y"])
+        for snake in request["snakes"]["data"]
+        for coord in snake["body"]["data"]
+    ])
+
+    moves = [
+        move for move, (dx, dy) in MOVES.items()
+        if 0 <= head["x"] + dx < request["width"] and 0 <= head["y"] + dy < request["height"]
+        and (head["x"] + dx, head["y"] + dy) not in occupied
+    ]
+
+    return random.choice(moves) if moves else "up"
+
+
+def respond(start_response, status, data):
+    body = json.dumps(data).encode("utf-8")
+    start_response(status, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+
+    return [body]
+
+
+def read_json(environ):
+    length = int(environ.get("CONTENT_LENGTH") or 0)
+    return json.loads(environ["wsgi.input"].read(length).decode("utf-8") or "null")
+
+
+def create_snake_app(index, latency):
+    def snake_app(environ, start_response):
+        path = environ["PATH_INFO"]
+        request = read_json(environ)
+
+        if path == "/start":
+            return respond(start_response, "200 OK", {
+                "name": "stub-{}".format(index),
+                "color": "#{:06x}".format((index * 0x3f7b21) % 0xffffff),
+                "taunt": "stub"
+            })
+        elif path == "/move":
+            if not latency.wait(): return respond(start_response, "500 Internal Server Error", { })
+            return respond(start_response, "200 OK", { "move": get_safe_move(request) })
+        elif path in ["/end", "/bounty/check"]:
+            return respond(start_response, "200 OK", { })
+
+        return respond(start_response, "404 Not Found", { })
+
+    return snake_app
+
+
+def create_daemon_app(latency):
+    def daemon_app(environ, start_response):
+        request = read_json(environ)
+        latency.wait()
+
+        return respond(start_response, "200 OK", {
+            "$spawn": { "walls": [] },
+            "message": "turn {}".format(request.get("turnNumber"))
+        })
+
+    return daemon_app
+
+
+def main():
+    args = parse_args()
+    servers = []
+
+    for index in range(0, args.snakes):
+        latency = Latency(args.latency, args.jitter, args.error_rate, args.timeout_rate, args.timeout_after)
+        servers.append(WSGIServer((args.host, args.port + index), create_snake_app(index, latency), log=None))
+
+    daemon_latency = Latency(args.daemon_latency, args.jitter)
+    servers.append(WSGIServer((args.host, args.port + args.snakes), create_daemon_app(daemon_latency), log=None))
+
+    for server in servers: server.start()
+
+    print("stubs listening on {}:{}-{}".format(args.host, args.port, args.port + args.snakes))
+    sys.stdout.flush()
+
+    gevent.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,80 @@
-import logging
-import postgresql
-import redis
-from flask import Flask
-from flask_socketio import SocketIO
-from pprint import pprint
-
 import saas.models
 from saas import settings
 
-app = Flask(__name__)
-socketio = SocketIO(app)
+# the headless engine (saas.engine, simulate.py) only needs the board and snakes, none of the
+# services below get set up or even imported
+if not settings.HEADLESS:
+    import logging
+    import postgresql
+    import redis
+    from flask import Flask
+    from flask_socketio import SocketIO
+    from pprint import pprint
+
+    from saas.client import HttpClient
+    from saas.database import ConnectionPool
+
+    app = Flask(__name__)
+    socketio = SocketIO(app)
+
+    postgres = ConnectionPool(
+        lambda: postgresql.open(user=settings.DB_USER, host=settings.DB_HOST, password=settings.DB_PASSWORD, database=settings.DB_NAME),
+        size=settings.DB_POOL_SIZE
+    )
+    # redis = redis.StrictRedis(host=settings.REDIS_HOST, password=settings.REDIS_PASSWORD, db=settings.REDIS_DATABASE)
+    redis = redis.StrictRedis(host=settings.REDIS_HOST, db=settings.REDIS_DATABASE)
+
+    http_client = HttpClient(
+        pool_connections=settings.HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+        dns_ttl=settings.HTTP_DNS_TTL
+    )
+
+    from saas.scheduler import Scheduler
+
+    scheduler = Scheduler(workers=settings.SCHEDULER_WORKERS)
+    scheduler.start()
+
+    from saas.viewers import ViewerCounts
+
+    viewers = ViewerCounts(redis, scheduler, sync_interval=settings.REDIS_VIEWER_SYNC_INTERVAL)
+    viewers.start()
+
+    from saas.metrics import Metrics
+
+    metrics = Metrics(redis, scheduler, flush_interval=settings.REDIS_METRICS_FLUSH_INTERVAL)
+    metrics.start()
+
+    from saas.profiler import Profiler
+
+    profiler = Profiler(interval=settings.PROFILER_INTERVAL)
+
+    from saas.history import HistoryWriter
+    from saas.replay import ReplayWriter
+
+    history_writer = HistoryWriter(
+        batch_size=settings.HISTORY_BATCH_SIZE,
+        flush_interval=settings.HISTORY_FLUSH_INTERVAL,
+        max_pending=settings.HISTORY_MAX_PENDING,
+        max_retries=settings.HISTORY_MAX_RETRIES,
+        retry_delay=settings.HISTORY_RETRY_DELAY,
+        replays=ReplayWriter(settings.REPLAY_DIR) if settings.REPLAY_DIR else None
+    )
+
+    history_writer.start()
+
+    from saas.status import StatusWriter
+
+    status_writer = StatusWriter(flush_interval=settings.STATUS_FLUSH_INTERVAL)
+    status_writer.start()
+
+    from saas import manager
 
-postgres = postgresql.open(user=settings.DB_USER, host=settings.DB_HOST, password=settings.DB_PASSWORD, database=settings.DB_NAME)
-# redis = redis.StrictRedis(host=settings.REDIS_HOST, password=settings.REDIS_PASSWORD, db=settings.REDIS_DATABASE)
-redis = redis.StrictRedis(host=settings.REDIS_HOST, db=settings.REDIS_DATABASE)
+    manager = manager.Manager()
 
-from saas import manager
+    from saas.listener import GameListener
 
-manager = manager.Manager()
+    game_listener = GameListener(postgres.connect, settings.DB_GAME_UPDATES_CHANNEL, manager.invalidate_game)
+    game_listener.start()
 
-from saas import routes
+    from saas import routes
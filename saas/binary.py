@@ -0,0 +1,339 @@
+import struct
+import zlib
+
+# compact binary encoding of `Game.to_json` frames for spectators. everything is little endian
+#
+# message   flags u8 (FLAG_COMPRESSED) + payload, the payload is zlib compressed when flagged
+# payload   magic "SF", version u8, flags u8 (FLAG_WIDE_COORDS, FLAG_LONG_COORDS), turn u32,
+#           viewers u32, width u16, height u16, strings, game id ref, daemon, errors, food,
+#           walls, teleporters, snakes, dead snakes
+# strings   start u32, count u32, count * text, new entries of the string table starting at
+#           index `start`, a table starting at 0 replaces the previous one. a ref below is a
+#           u32 index into that table (NONE for None). only values that stay the same for
+#           most of a game (ids, names, colours, death reasons...) are interned, so they are
+#           sent once. the table is reset once it holds MAX_STRINGS
+# text      length u16 (NO_TEXT for None) + utf-8, truncated to MAX_TEXT_LENGTH bytes. taunts,
+#           errors and daemon messages change all the time and are sent as text every frame
+# coords    x, y as i8, i16 with FLAG_WIDE_COORDS or i32 with FLAG_LONG_COORDS. the narrowest
+#           that fits every coordinate of the frame, dead snakes keep moving off the board
+# daemon    present u8 [id ref, name ref, url ref, message text]
+# errors    count u16, count * (snake id ref, message text)
+# food      count u32, count * coord (walls are the same)
+# teleporters   count u32, count * (coord, channel u16)
+# snakes    count u16, count * (id ref, name ref, color ref, taunt text, error text,
+#           health i16, score f32, kills u16, gold u16, dead u8 [turn u32, reason ref,
+#           killer ref], body length u32, length * coord, runs u32, runs * (run length u32,
+#           color ref))
+
+MAGIC = b"SF"
+VERSION = 2
+
+FLAG_COMPRESSED = 0x01
+FLAG_WIDE_COORDS = 0x01
+FLAG_LONG_COORDS = 0x02
+
+NONE = 0xFFFFFFFF
+NO_TEXT = 0xFFFF
+
+MAX_STRINGS = 1024
+MAX_TEXT_LENGTH = 1024
+
+
+def pack_text(value):
+    if value is None: return struct.pack("<H", NO_TEXT)
+
+    encoded = str(value).encode("utf-8")
+
+    if len(encoded) > MAX_TEXT_LENGTH:
+        # cut on a character boundary
+        encoded = encoded[:MAX_TEXT_LENGTH].decode("utf-8", "ignore").encode("utf-8")
+
+    return struct.pack("<H", len(encoded)) + encoded
+
+
+class FrameEncoder(object):
+    def __init__(self, compression_level=1):
+        self.compression_level = compression_level
+
+        self.strings = []
+        self.string_index = { }
+        self.strings_sent = 0
+
+    def intern(self, value):
+        if value is None: return NONE
+
+        value = str(value)[:MAX_TEXT_LENGTH]
+        index = self.string_index.get(value)
+
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(value)
+            self.string_index[value] = index
+
+        return index
+
+    def encode(self, frame, full_table=False, compress=False):
+        return self.pack_message(self.encode_payload(frame, full_table=full_table), compress=compress)
+
+    def pack_message(self, payload, compress=False):
+        if compress:
+            return bytes([FLAG_COMPRESSED]) + zlib.compress(payload, self.compression_level)
+
+        return bytes([0]) + payload
+
+    def encode_payload(self, frame, full_table=False):
+        # frames for a single new spectator carry the whole string table, broadcast frames
+        # only the strings added since the previous broadcast
+        if len(self.strings) >= MAX_STRINGS: self.reset_strings()
+
+        board = frame["board"]
+        snakes = board.get("snakes", [])
+        dead_snakes = board.get("deadSnakes", [])
+
+        coords = [ (coord["x"], coord["y"]) for key in ["food", "walls", "teleporters"] for coord in board.get(key, []) ]
+        coords.extend([ (coord["x"], coord["y"]) for snake in snakes + dead_snakes for coord in snake["coords"] ])
+
+        low = min([ min(x, y) for x, y in coords ], default=0)
+        high = max([ max(x, y) for x, y in coords ], default=0)
+
+        if -0x80 <= low and high <= 0x7F: coord_flags, coord_format = 0, "b"
+        elif -0x8000 <= low and high <= 0x7FFF: coord_flags, coord_format = FLAG_WIDE_COORDS, "h"
+        else: coord_flags, coord_format = FLAG_LONG_COORDS, "i"
+
+        body = bytearray()
+        body += struct.pack("<I", self.intern(frame.get("id")))
+
+        daemon = frame.get("daemon")
+        if daemon:
+            body += struct.pack(
+                "<BIII", 1,
+                self.intern(daemon.get("id")),
+                self.intern(daemon.get("name")),
+                self.intern(daemon.get("url"))
+            )
+            body += pack_text(daemon.get("message"))
+        else:
+            body += struct.pack("<B", 0)
+
+        errors = frame.get("errors") or { }
+        body += struct.pack("<H", len(errors))
+        for snake_id, error in errors.items():
+            body += struct.pack("<I", self.intern(snake_id)) + pack_text(error)
+
+        for key in ["food", "walls"]:
+            things = board.get(key, [])
+            body += struct.pack("<I", len(things))
+            body += self._pack_coords(coord_format, things)
+
+        teleporters = board.get("teleporters", [])
+        body += struct.pack("<I", len(teleporters))
+        for teleporter in teleporters:
+            body += struct.pack("<2{}H".format(coord_format), teleporter["x"], teleporter["y"], teleporter["channel"])
+
+        for snake_list in [snakes, dead_snakes]:
+            body += struct.pack("<H", len(snake_list))
+            for snake in snake_list:
+                body += self._pack_snake(coord_format, snake)
+
+        strings_start = 0 if full_table else self.strings_sent
+        new_strings = self.strings[strings_start:]
+
+        if not full_table: self.strings_sent = len(self.strings)
+
+        payload = bytearray(MAGIC)
+        payload += struct.pack(
+            "<BBIIHH",
+            VERSION,
+            coord_flags,
+            frame.get("turnNumber") or 0,
+            frame.get("viewers") or 0,
+            board["width"],
+            board["height"]
+        )
+
+        payload += struct.pack("<II", strings_start, len(new_strings))
+        for string in new_strings:
+            payload += pack_text(string)
+
+        payload += body
+
+        return bytes(payload)
+
+    def reset_strings(self):
+        # the next broadcast starts a new table at 0, which replaces the one spectators have
+        self.strings = []
+        self.string_index = { }
+        self.strings_sent = 0
+
+    def _pack_coords(self, coord_format, coords):
+        values = [ value for coord in coords for value in (coord["x"], coord["y"]) ]
+        return struct.pack("<{}{}".format(len(values), coord_format), *values)
+
+    def _pack_snake(self, coord_format, snake):
+        death = snake.get("death")
+        segments = snake["coords"]
+        color = snake.get("color")
+
+        data = bytearray(struct.pack(
+            "<III",
+            self.intern(snake["id"]),
+            self.intern(snake.get("name")),
+            self.intern(color)
+        ))
+        data += pack_text(snake.get("taunt"))
+        data += pack_text(snake.get("error"))
+        data += struct.pack(
+            "<hfHH",
+            int(snake.get("health") or 0),
+            float(snake.get("score") or 0),
+            snake.get("kills") or 0,
+            snake.get("goldCount") or 0
+        )
+
+        if death:
+            data += struct.pack(
+                "<BIII", 1,
+                death.get("turn") or 0,
+                self.intern(death.get("reason")),
+                self.intern(death.get("killer"))
+            )
+        else:
+            data += struct.pack("<B", 0)
+
+        data += struct.pack("<I", len(segments))
+        data += self._pack_coords(coord_format, segments)
+
+        # segment colours as runs, almost always a single run of the snake's colour
+        runs = []
+        for segment in segments:
+            segment_color = segment.get("color", color)
+
+            if runs and runs[-1][1] == segment_color: runs[-1][0] = runs[-1][0] + 1
+            else: runs.append([1, segment_color])
+
+        data += struct.pack("<I", len(runs))
+        for run_length, run_color in runs:
+            data += struct.pack("<II", run_length, self.intern(run_color))
+
+        return data
+
+
+class FrameDecoder(object):
+    def __init__(self):
+        self.strings = []
+
+    def decode(self, message):
+        payload = message[1:]
+        if message[0] & FLAG_COMPRESSED: payload = zlib.decompress(payload)
+
+        if payload[:2] != MAGIC:
+            raise ValueError("not a frame")
+
+        self.payload = payload
+        self.offset = 2
+
+        version, flags, turn_number, viewers, width, height = self._read("<BBIIHH")
+        coord_format = "i" if flags & FLAG_LONG_COORDS else "h" if flags & FLAG_WIDE_COORDS else "b"
+
+        strings_start, string_count = self._read("<II")
+        if strings_start == 0: self.strings = []
+
+        for index in range(strings_start, strings_start + string_count):
+            string = self._text()
+
+            if index < len(self.strings): self.strings[index] = string
+            else: self.strings.append(string)
+
+        game_id = self._string(self._read("<I")[0])
+
+        daemon = None
+        if self._read("<B")[0]:
+            daemon_id, name, url = [ self._string(ref) for ref in self._read("<III") ]
+            daemon = { "id": daemon_id, "name": name, "url": url, "message": self._text() }
+
+        errors = { }
+        for _ in range(0, self._read("<H")[0]):
+            snake_id, = self._read("<I")
+            errors[self._string(snake_id)] = self._text()
+
+        board = { "width": width, "height": height }
+
+        for key in ["food", "walls"]:
+            count, = self._read("<I")
+            board[key] = self._read_coords(coord_format, count)
+
+        board["teleporters"] = []
+        for _ in range(0, self._read("<I")[0]):
+            x, y, channel = self._read("<2{}H".format(coord_format))
+            board["teleporters"].append({ "x": x, "y": y, "channel": channel })
+
+        for key in ["snakes", "deadSnakes"]:
+            count, = self._read("<H")
+            board[key] = [ self._read_snake(coord_format) for _ in range(0, count) ]
+
+        return {
+            "id": game_id,
+            "board": board,
+            "daemon": daemon,
+            "errors": errors or None,
+            "turnNumber": turn_number,
+            "viewers": viewers
+        }
+
+    def _read(self, fmt):
+        values = struct.unpack_from(fmt, self.payload, self.offset)
+        self.offset = self.offset + struct.calcsize(fmt)
+        return values
+
+    def _read_coords(self, coord_format, count):
+        values = self._read("<{}{}".format(count * 2, coord_format))
+        return [ { "x": values[index], "y": values[index + 1] } for index in range(0, len(values), 2) ]
+
+    def _read_snake(self, coord_format):
+        snake_id, name, color = self._read("<III")
+        taunt = self._text()
+        error = self._text()
+        health, score, kills, gold = self._read("<hfHH")
+
+        death = None
+        if self._read("<B")[0]:
+            turn, reason, killer = self._read("<III")
+            death = { "turn": turn, "reason": self._string(reason), "killer": self._string(killer) }
+
+        length, = self._read("<I")
+        coords = self._read_coords(coord_format, length)
+
+        segment = 0
+        for _ in range(0, self._read("<I")[0]):
+            run_length, run_color = self._read("<II")
+
+            for coord in coords[segment:segment + run_length]:
+                coord["color"] = self._string(run_color)
+
+            segment = segment + run_length
+
+        return {
+            "id": self._string(snake_id),
+            "color": self._string(color),
+            "coords": coords,
+            "death": death,
+            "error": error,
+            "name": self._string(name),
+            "goldCount": gold,
+            "health": health,
+            "kills": kills,
+            "score": score,
+            "taunt": taunt
+        }
+
+    def _string(self, ref):
+        return None if ref == NONE else self.strings[ref]
+
+    def _text(self):
+        length, = self._read("<H")
+        if length == NO_TEXT: return None
+
+        text = bytes(self.payload[self.offset:self.offset + length]).decode("utf-8")
+        self.offset = self.offset + length
+
+        return text
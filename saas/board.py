@@ -6,6 +6,7 @@ from typing import Any, Dict, List
 
 from .patch import get_coordinate, get_snake, wrap_list
 from .constants import SPAWN_STRATEGY_RANDOM, SPAWN_STRATEGY_STATIC, SPAWN_STRATEGY_DONT_RESPAWN
+from .items import FoodStore, ItemStore, TeleporterStore
 from .types import Position, PositionList
 
 BoardPosition = Dict[str, int]
@@ -28,6 +29,21 @@ class Board:
     MOVE_LEFT = "left"
     MOVE_RIGHT = "right"
 
+    MOVE_VECTORS = {
+        MOVE_UP: (0, -1),
+        MOVE_DOWN: (0, 1),
+        MOVE_LEFT: (-1, 0),
+        MOVE_RIGHT: (1, 0)
+    }
+
+    # lookup precedence when several things share a cell
+    BOARD_TYPE_PRECEDENCE = {
+        BOARD_TYPE_SNAKE: 0,
+        BOARD_TYPE_FOOD: 1,
+        BOARD_TYPE_GOLD: 2,
+        BOARD_TYPE_WALL: 3,
+        BOARD_TYPE_TELEPORTER: 4
+    }
 
     def __init__(self, snakes, width: int = 20, height: int = 20, configuration=None):
         self.snakes = snakes
@@ -37,59 +53,140 @@ class Board:
             self.width = self.configuration["boardColumns"]
             self.height = self.configuration["boardRows"]
 
-            self.food = self.configuration["food"]
-            self.gold = self.configuration["gold"]
-            self.teleporters = self.configuration["teleporters"]
-            self.walls = self.configuration["walls"]
+            self.food = FoodStore(self.configuration["food"])
+            self.gold = ItemStore(self.configuration["gold"])
+            self.teleporters = TeleporterStore(self.configuration["teleporters"])
+            self.walls = ItemStore(self.configuration["walls"])
         else:
             self.width = width
             self.height = height
 
-            self.food = []
-            self.gold = []
-            self.teleporters = []
-            self.walls = []
+            self.food = FoodStore()
+            self.gold = ItemStore()
+            self.teleporters = TeleporterStore()
+            self.walls = ItemStore()
 
         self.last_wall_spawn = None
         self.last_gold_spawn = None
+
+        # bumped on every mutation, serialized boards are cached per api version until then
+        self.version = 0
+        self._json_cache = { }
+        self._json_cache_version = None
+
+        self.reindex()
         self.initialize_snakes()
 
     def clear(self):
-        self.food = []
-        self.gold = []
-        self.teleporters = []
-        self.walls = []
+        self.food = FoodStore()
+        self.gold = ItemStore()
+        self.teleporters = TeleporterStore()
+        self.walls = ItemStore()
 
+        self.reindex()
         self.initialize_snakes()
 
-    def get_at_position(self, x: int, y: int, exclude: List[Any] = None):
+    def touch(self):
+        # call after changing snake state the board can't see (taunts, errors, names...)
+        self.version = self.version + 1
+
+    def reindex(self):
+        self.touch()
+
+        # (x, y) -> [(type, thing), ...] for everything on the board, snakes have one
+        # entry per body segment. kept up to date by every method that moves things around
+        self.grid = { }
+        self.snake_order = { snake_id: index for index, snake_id in enumerate(self.snakes.keys()) }
+
+        # every empty cell on the board, the list allows O(1) sampling and the index
+        # O(1) removal (swap with the last cell)
+        self.free_cells = [ (x, y) for x in range(0, self.width) for y in range(0, self.height) ]
+        self.free_cell_index = { position: index for index, position in enumerate(self.free_cells) }
+
         for snake_id, snake in self.snakes.items():
-            if exclude and snake in exclude: continue
-            for body_segment in snake.body:
-                if body_segment["x"] == x and body_segment["y"] == y:
-                    return Board.BOARD_TYPE_SNAKE, snake
+            for x, y in snake.get_positions():
+                self._occupy(x, y, Board.BOARD_TYPE_SNAKE, snake)
+
+        for value, things in [
+            (Board.BOARD_TYPE_FOOD, self.food),
+            (Board.BOARD_TYPE_GOLD, self.gold),
+            (Board.BOARD_TYPE_WALL, self.walls),
+            (Board.BOARD_TYPE_TELEPORTER, self.teleporters)
+        ]:
+            for thing in things:
+                self._occupy(thing["x"], thing["y"], value, thing)
+
+    def _occupy(self, x: int, y: int, value: int, thing: Any, first: bool = False):
+        self.version = self.version + 1
+        occupants = self.grid.get((x, y))
+
+        if occupants is None:
+            self.grid[(x, y)] = [(value, thing)]
+            self._remove_free_cell((x, y))
+        elif first: occupants.insert(0, (value, thing))
+        else: occupants.append((value, thing))
+
+    def _vacate(self, x: int, y: int, value: int, thing: Any):
+        self.version = self.version + 1
+        occupants = self.grid.get((x, y))
+        if not occupants: return
+
+        for index, (m_value, m_thing) in enumerate(occupants):
+            if m_value == value and m_thing is thing:
+                del occupants[index]
+                break
+
+        if not occupants:
+            del self.grid[(x, y)]
+            self._add_free_cell((x, y))
+
+    def _add_free_cell(self, position: Position):
+        if position in self.free_cell_index: return
+        if position[0] < 0 or position[0] >= self.width or position[1] < 0 or position[1] >= self.height: return
+
+        self.free_cell_index[position] = len(self.free_cells)
+        self.free_cells.append(position)
+
+    def _remove_free_cell(self, position: Position):
+        index = self.free_cell_index.pop(position, None)
+        if index is None: return
+
+        last_position = self.free_cells.pop()
+
+        if last_position != position:
+            self.free_cells[index] = last_position
+            self.free_cell_index[last_position] = index
+
+    def _push_head(self, snake, x: int, y: int, color: str):
+        snake.push_head(x, y, color)
+        self._occupy(x, y, Board.BOARD_TYPE_SNAKE, snake)
+
+    def _pop_head(self, snake):
+        x, y = snake.pop_head()
+        self._vacate(x, y, Board.BOARD_TYPE_SNAKE, snake)
+
+    def _pop_tail(self, snake):
+        x, y = snake.pop_tail()
+        self._vacate(x, y, Board.BOARD_TYPE_SNAKE, snake)
 
-        for food in self.food:
-            if exclude and food in exclude: continue
-            if food["x"] == x and food["y"] == y:
-                return Board.BOARD_TYPE_FOOD, food
+    def get_at_position(self, x: int, y: int, exclude: List[Any] = None):
+        occupants = self.grid.get((x, y))
+        if not occupants: return Board.BOARD_TYPE_EMPTY, None
 
-        for gold in self.gold:
-            if exclude and gold in exclude: continue
-            if gold["x"] == x and gold["y"] == y:
-                return Board.BOARD_TYPE_GOLD, gold
+        value, thing = Board.BOARD_TYPE_EMPTY, None
 
-        for wall in self.walls:
-            if exclude and wall in exclude: continue
-            if wall["x"] == x and wall["y"] == y:
-                return Board.BOARD_TYPE_WALL, wall
+        for m_value, m_thing in occupants:
+            if exclude and m_thing in exclude: continue
 
-        for teleporter in self.teleporters:
-            if exclude and teleporter in exclude: continue
-            if teleporter["x"] == x and teleporter["y"] == y:
-                return Board.BOARD_TYPE_TELEPORTER, teleporter
+            if value == Board.BOARD_TYPE_EMPTY or \
+                Board.BOARD_TYPE_PRECEDENCE[m_value] < Board.BOARD_TYPE_PRECEDENCE[value]:
+                value, thing = m_value, m_thing
+            elif m_value == Board.BOARD_TYPE_SNAKE and value == Board.BOARD_TYPE_SNAKE and \
+                self.snake_order[m_thing.id] < self.snake_order[thing.id]:
+                # overlapping snakes resolve in turn order
+                thing = m_thing
 
-        return Board.BOARD_TYPE_EMPTY, None
+        return value, thing
 
     def get_neighbors(self, position: BoardPosition):
         neighbors = [
@@ -108,19 +205,36 @@ class Board:
         ]
 
     def get_random_empty_position(self, positions: PositionList = None, exclude: PositionList = None) -> Position:
+        empty_positions = self.get_random_empty_positions(1, positions=positions, exclude=exclude)
+        return empty_positions[0] if empty_positions else None
+
+    def get_random_empty_positions(self, count: int, positions: PositionList = None, exclude: PositionList = None) -> PositionList:
+        # up to `count` distinct empty cells, preferring `positions` when given. returns
+        # fewer (possibly none) when the board runs out of space
+        exclude = set([ tuple(position) for position in exclude ]) if exclude else set()
+        empty_positions = []
+
         if positions is not None:
-            for position in random.shuffle(positions):
-                value, thing = self.get_at_position(position["x"], position["y"])
-                if value == Board.BOARD_TYPE_EMPTY: return position["x"], position["y"]
+            candidates = list(dict.fromkeys([
+                (position["x"], position["y"]) for position in positions
+                if (position["x"], position["y"]) in self.free_cell_index and \
+                    (position["x"], position["y"]) not in exclude
+            ]))
+
+            random.shuffle(candidates)
+            empty_positions = candidates[:count]
+
+        remaining = count - len(empty_positions)
 
-        x = random.randint(0, self.width - 1)
-        y = random.randint(0, self.height - 1)
+        if remaining > 0:
+            exclude.update(empty_positions)
 
-        while self.get_at_position(x, y)[0] != Board.BOARD_TYPE_EMPTY:
-            x = random.randint(0, self.width - 1)
-            y = random.randint(0, self.height - 1)
+            sample_size = min(remaining + len(exclude), len(self.free_cells))
+            sample = random.sample(self.free_cells, sample_size)
 
-        return x, y
+            empty_positions.extend([ position for position in sample if position not in exclude ][:remaining])
+
+        return empty_positions
 
     def get_food(self):
         return self.food
@@ -153,7 +267,13 @@ class Board:
         return len(self.walls)
 
     def initialize_snakes(self, snake_start_length=3):
+        self.touch()
+        placements = { }
+
         for index, (snake_id, snake) in enumerate(self.snakes.items()):
+            for x, y in snake.get_positions():
+                self._vacate(x, y, Board.BOARD_TYPE_SNAKE, snake)
+
             snake.reset()
 
             if self.configuration:
@@ -165,168 +285,265 @@ class Board:
 
                 if m_snake and "coords" in m_snake:
                     snake.body = [coord for coord in m_snake["coords"]]
+
+                    for x, y in snake.get_positions():
+                        self._occupy(x, y, Board.BOARD_TYPE_SNAKE, snake)
+
                     continue
 
-            # default to random placement
+            placements[snake_id] = snake
+
+        # default to random placement, all heads are picked up front
+        heads = self.get_random_empty_positions(len(placements))
+
+        for (snake_id, snake), head in zip(placements.items(), heads):
+            other_heads = [ [x, y] for (x, y) in heads if (x, y) != head ]
+
             for _ in range(0, snake_start_length):
-                if not snake.body: x, y = self.get_random_empty_position()
+                if not snake.length: x, y = head
                 else:
+                    body = [ [x, y] for x, y in snake.get_positions() ]
                     neighbors = [
                         n for n in
-                        self.get_neighbors(position=snake.body[-1])
-                        if n not in [ [p["x"], p["y"]] for p in snake.body ]
+                        self.get_neighbors(position=snake.tail)
+                        if n not in body and n not in other_heads
                     ]
 
                     if not neighbors: break
 
                     x, y = random.choice(neighbors)
 
-                snake.body.append({ "x": x, "y": y, "color": snake.color })
+                snake.append(x, y, snake.color)
+                self._occupy(x, y, Board.BOARD_TYPE_SNAKE, snake)
 
     def spawn_food_by_strat(self, strat: str):
         if strat == SPAWN_STRATEGY_RANDOM:
             return self.spawn_random_food()
         elif strat == SPAWN_STRATEGY_STATIC:
-            hidden_food = [food for food in self.food if food["hidden"] == True]
-            if hidden_food and len(hidden_food) > 0:
-                food = random.choice(hidden_food)
+            food = self.food.get_random_hidden()
+            if food:
                 return self.spawn_food(food["x"], food["y"])
 
     def spawn_random_food(self, count = 1):
-        for index in range(0, count):
-            x, y = self.get_random_empty_position(
-                positions=self.configuration["food"] if self.configuration else None
-            )
+        positions = self.get_random_empty_positions(
+            count,
+            positions=self.configuration["food"] if self.configuration else None
+        )
 
+        for x, y in positions:
             self.spawn_food(x, y)
 
     def spawn_food(self, x, y):
         m_type, thing = self.get_at_position(x, y)
 
-        if thing and m_type == Board.BOARD_TYPE_FOOD:
-            m_thing = thing.copy()
-            m_thing["hidden"] = False
-
-            self.food.insert(self.food.index(thing), m_thing)
+        if thing and m_type == Board.BOARD_TYPE_FOOD and thing.get("hidden", False):
+            # the hidden food stays underneath, it's back once the visible one is eaten
+            food = self.food.reveal(thing)
+            self._occupy(x, y, Board.BOARD_TYPE_FOOD, food, first=True)
             return
         elif thing:
             return
 
-        self.food.append({ "x": x, "y": y })
+        food = { "x": x, "y": y }
+        self.food.add(food)
+        self._occupy(x, y, Board.BOARD_TYPE_FOOD, food)
 
     def spawn_random_gold(self, count = 1):
-        for index in range(0, count):
-            x, y = self.get_random_empty_position(
-                positions=self.configuration["gold"] if self.configuration else None
-            )
+        positions = self.get_random_empty_positions(
+            count,
+            positions=self.configuration["gold"] if self.configuration else None
+        )
 
+        for x, y in positions:
             self.spawn_gold(x, y)
 
     def spawn_gold(self, x, y):
-        self.gold.append({ "x": x, "y": y })
+        if self.gold.get((x, y)): return
+
+        gold = { "x": x, "y": y }
+        self.gold.add(gold)
+        self._occupy(x, y, Board.BOARD_TYPE_GOLD, gold)
         self.last_gold_spawn = time.time()
 
     def spawn_random_teleporters(self, count = 1):
-        for index in range(0, (count * 2)):
-            x, y = self.get_random_empty_position(
-                positions=self.configuration["teleporters"] if self.configuration else None
-            )
+        positions = self.get_random_empty_positions(
+            count * 2,
+            positions=self.configuration["teleporters"] if self.configuration else None
+        )
 
+        for x, y in positions:
             self.spawn_teleporter(x, y, math.ceil(count / 2))
 
     def spawn_teleporter(self, x, y, channel):
-        self.teleporters.append({ "x": x, "y": y, "channel": channel })
+        teleporter = { "x": x, "y": y, "channel": channel }
+
+        # the store replaces a teleporter already on the cell, the grid has to follow
+        old_teleporter = self.teleporters.get((x, y))
+        if old_teleporter: self._vacate(x, y, Board.BOARD_TYPE_TELEPORTER, old_teleporter)
+
+        self.teleporters.add(teleporter)
+        self._occupy(x, y, Board.BOARD_TYPE_TELEPORTER, teleporter)
 
     def spawn_random_walls(self, count = 1):
-        for index in range(0, (count * 2)):
-            x, y = self.get_random_empty_position(
-                positions=self.configuration["walls"] if self.configuration else None
-            )
+        positions = self.get_random_empty_positions(
+            count * 2,
+            positions=self.configuration["walls"] if self.configuration else None
+        )
 
+        for x, y in positions:
             self.spawn_wall(x, y)
 
     def spawn_wall(self, x: int, y: int):
-        self.walls.append({ "x": x, "y": y })
+        if self.walls.get((x, y)): return
+
+        wall = { "x": x, "y": y }
+        self.walls.add(wall)
+        self._occupy(x, y, Board.BOARD_TYPE_WALL, wall)
         self.last_wall_spawn = time.time()
 
     def update(self, game, snakes, tick_snakes = True):
-        self.snakes = snakes
+        self.touch()
+
+        if snakes is not self.snakes:
+            self.snakes = snakes
+            self.reindex()
 
         if tick_snakes:
-            # update all positions and health
-            for snake_id, snake in self.snakes.items():
-                current_head_position = snake.head
-                next_position_vector = {
-                    Board.MOVE_UP: [0, -1],
-                    Board.MOVE_DOWN: [0, 1],
-                    Board.MOVE_LEFT: [-1, 0],
-                    Board.MOVE_RIGHT: [1, 0]
-                }[snake.next_move]
-
-                snake.body.appendleft({
-                    "x": snake.head["x"] + next_position_vector[0],
-                    "y": snake.head["y"] + next_position_vector[1],
-                    "color": snake.head.get("color", snake.color)
-                })
-
-            for snake_id, snake in self.snakes.items():
-                # reset head
-                current_head_position = snake.head
-                head_x = current_head_position["x"]
-                head_y = current_head_position["y"]
-
-                if head_x < 0 or head_x >= self.width or head_y < 0 or head_y >= self.height:
-                    snake.kill(game.turn_number, "oob")
-                    continue
+            moved = [ snake for snake_id, snake in self.snakes.items() if snake.length ] # some never found space
 
-                value, thing = self.get_at_position(head_x, head_y, [snake])
-
-                if value == Board.BOARD_TYPE_FOOD:
-                    snake.health = 100
-                    self.food.remove(thing)
-                elif value == Board.BOARD_TYPE_GOLD:
-                    snake.score = snake.score + 5 # todo custom gold values?
-                    snake.incr_gold()
-
-                    self.gold.remove(thing)
-                elif value == Board.BOARD_TYPE_WALL:
-                    snake.kill(game.turn_number, "wall")
-                elif value == Board.BOARD_TYPE_TELEPORTER:
-                    channel = thing["channel"]
-                    channel_teleporters = [
-                        teleporter for teleporter in self.teleporters
-                        if teleporter["channel"] == channel and (
-                            teleporter["x"] != thing["x"] or
-                            teleporter["y"] != thing["y"]
-                        )
-                    ]
+            for snake in moved:
+                head_x, head_y = snake.head_position
+                dx, dy = Board.MOVE_VECTORS[snake.next_move]
 
-                    if channel_teleporters:
-                        teleporter = random.choice(channel_teleporters)
-                        snake.body.popleft() # remove current head
-                        snake.body.appendleft({
-                            "x": teleporter["x"],
-                            "y": teleporter["y"],
-                            "color": current_head_position["color"]
-                        })
-                elif value == Board.BOARD_TYPE_SNAKE:
-                    snake_head = thing.head
-
-                    if snake_head["x"] == head_x and snake_head["y"] == head_y:
-                        # head to head collision
-                        if snake.length > thing.length:
-                            # handle the other snake's death in their loop iteration
-                            snake.score = snake.score + 1
-                        else:
-                            snake.kill(game.turn_number, "killed", thing.id)
-                            thing.incr_kills()
-                    else:
-                        snake.kill(game.turn_number, "collision", thing.id)
+                self._push_head(snake, head_x + dx, head_y + dy, snake.head_color)
+
+            self.resolve_moves(game, moved)
+
+        self.touch()
+
+    def resolve_moves(self, game, snakes):
+        # every head is resolved at once against the same board, turn order only decides who
+        # gets credited for a kill. with all heads moved: snakes that landed on an empty cell
+        # move their tail, then heads are checked against other bodies and other heads, then
+        # whoever didn't hit a snake takes what's on its cell
+        pin_tail = game.game["pinTail"]
+
+        heads = { } # (x, y) -> [snakes with their head there]
+        landed = [] # (snake, position, value, thing) for every head sharing its cell
+
+        for snake in snakes:
+            head_x, head_y = position = snake.head_position
+
+            if head_x < 0 or head_x >= self.width or head_y < 0 or head_y >= self.height:
+                snake.kill(game.turn_number, "oob")
+                continue
+
+            if len(self.grid[position]) == 1:
+                # alone on an empty cell, like most heads. nothing else can end up there
+                if not pin_tail: self._pop_tail(snake)
+
+                snake.score = snake.score + 0.1
+                continue
+
+            if position in heads: heads[position].append(snake)
+            else: heads[position] = [snake]
+
+            landed.append((snake, position) + self._get_item_at_position(head_x, head_y))
+
+        if not pin_tail:
+            for snake, position, value, thing in landed:
+                if value == Board.BOARD_TYPE_EMPTY: self._pop_tail(snake)
+
+        clear = []
+
+        for snake, position, value, thing in landed:
+            body = self._get_body_at_position(position, snake, heads[position])
+            other_heads = [ other for other in heads[position] if other is not snake ]
+
+            if body:
+                snake.kill(game.turn_number, "collision", body.id)
+            elif other_heads:
+                longest = max([ other.length for other in other_heads ])
+
+                if snake.length > longest:
+                    snake.score = snake.score + len(other_heads)
                 else:
-                    snake.score = snake.score + 0.1
-                    if not game.game["pinTail"]: snake.body.pop()
+                    killer = [ other for other in other_heads if other.length == longest ][0]
+
+                    snake.kill(game.turn_number, "killed", killer.id)
+                    killer.incr_kills()
+            else:
+                clear.append((snake, position, value, thing))
+
+        for snake, (head_x, head_y), value, thing in clear:
+            if value == Board.BOARD_TYPE_FOOD:
+                snake.health = 100
+                self.food.remove(thing)
+                self._vacate(head_x, head_y, Board.BOARD_TYPE_FOOD, thing)
+            elif value == Board.BOARD_TYPE_GOLD:
+                snake.score = snake.score + 5 # todo custom gold values?
+                snake.incr_gold()
+
+                self.gold.remove(thing)
+                self._vacate(head_x, head_y, Board.BOARD_TYPE_GOLD, thing)
+            elif value == Board.BOARD_TYPE_WALL:
+                snake.kill(game.turn_number, "wall")
+            elif value == Board.BOARD_TYPE_TELEPORTER:
+                teleporter = self.teleporters.get_destination(thing)
+
+                if teleporter:
+                    head_color = snake.head_color
+
+                    self._pop_head(snake) # remove current head
+                    self._push_head(snake, teleporter["x"], teleporter["y"], head_color)
+            else:
+                snake.score = snake.score + 0.1
+
+    def _get_body_at_position(self, position: Position, snake, heads: List[Any]):
+        # the first snake in turn order, other than `snake`, with a segment besides its head on
+        # the cell. `heads` are the snakes with their head there
+        body = None
+        counted_heads = []
+
+        for value, thing in self.grid[position]:
+            if value != Board.BOARD_TYPE_SNAKE or thing is snake: continue
+
+            if thing in heads and thing not in counted_heads:
+                counted_heads.append(thing)
+                continue
+
+            if body is None or self.snake_order[thing.id] < self.snake_order[body.id]: body = thing
+
+        return body
+
+    def _get_item_at_position(self, x: int, y: int):
+        # like get_at_position, ignoring snakes
+        value, thing = Board.BOARD_TYPE_EMPTY, None
+
+        for m_value, m_thing in self.grid.get((x, y), []):
+            if m_value == Board.BOARD_TYPE_SNAKE: continue
+
+            if value == Board.BOARD_TYPE_EMPTY or \
+                Board.BOARD_TYPE_PRECEDENCE[m_value] < Board.BOARD_TYPE_PRECEDENCE[value]:
+                value, thing = m_value, m_thing
+
+        return value, thing
 
     def to_json(self, api_version: str = None):
+        if self._json_cache_version != self.version:
+            self._json_cache = { }
+            self._json_cache_version = self.version
+
+        board_json = self._json_cache.get(api_version)
+
+        if board_json is None:
+            board_json = self._to_json(api_version)
+            self._json_cache[api_version] = board_json
+
+        # callers add their own top level keys (turn, you...), the nested values are shared
+        return dict(board_json)
+
+    def _to_json(self, api_version: str = None):
         if api_version == "2018": snakes = [ snake for snake_id, snake in self.snakes.items() ]
         else: snakes = [ snake for snake_id, snake in self.snakes.items() if snake.is_alive ]
 
@@ -353,7 +570,7 @@ class Board:
             return board_json
 
         board_json["deadSnakes"] = [ get_snake(snake, api_version) for snake in dead_snakes ]
-        board_json["teleporters"] = self.teleporters
+        board_json["teleporters"] = list(self.teleporters)
         board_json["walls"] = [ get_coordinate(coord, api_version) for coord in self.walls ]
 
         return board_json
@@ -370,7 +587,7 @@ class Board:
                 elif value == Board.BOARD_TYPE_FOOD: char = "O"
                 elif value == Board.BOARD_TYPE_GOLD: char = "X"
                 elif value == Board.BOARD_TYPE_SNAKE:
-                    if [x, y] == [thing.head["x"], thing.head["y"]]: char = "*"
+                    if (x, y) == thing.head_position: char = "*"
                     else: char = "="
                 elif value == Board.BOARD_TYPE_WALL: char = "¤"
 
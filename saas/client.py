@@ -0,0 +1,213 @@
+import socket
+import time
+
+from collections import OrderedDict
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectTimeout
+from threading import Lock
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, EmptyPoolError, NewConnectionError
+from urllib3.poolmanager import PoolManager
+from urllib3.util import Timeout, connection
+
+
+class DnsCache(object):
+    # addresses per (host, port), kept for `ttl` seconds. only the http client's connections
+    # resolve through it. least recently used entries go once there are `max_entries`
+    def __init__(self, ttl=60, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict() # (host, port) -> (expires at, [address])
+        self._lock = Lock()
+
+    def resolve(self, host, port):
+        key = (host, port)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits = self.hits + 1
+                return entry[1]
+
+            self._entries.pop(key, None)
+            self.misses = self.misses + 1
+
+        # resolved outside the lock, concurrent misses for the same host all look it up
+        addresses = list(OrderedDict.fromkeys([
+            sockaddr[0] for family, type, proto, name, sockaddr
+            in socket.getaddrinfo(host, port, connection.allowed_gai_family(), socket.SOCK_STREAM)
+        ]))
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl, addresses)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return addresses
+
+    def get_stats(self):
+        return { "hits": self.hits, "misses": self.misses, "entries": len(self._entries) }
+
+
+class CachedDnsConnectionMixin(object):
+    dns_cache = None
+
+    def _new_conn(self):
+        # like urllib3's, but the addresses come from the dns cache. they are tried in order
+        if self.dns_cache is None: addresses = [self.host]
+        else:
+            try: addresses = self.dns_cache.resolve(self.host, self.port)
+            except socket.gaierror as error:
+                raise NewConnectionError(self, "Failed to resolve {}: {}".format(self.host, error))
+
+        error = NewConnectionError(self, "No addresses for {}".format(self.host))
+
+        for address in addresses:
+            try:
+                return connection.create_connection(
+                    (address, self.port),
+                    self.timeout,
+                    source_address=self.source_address,
+                    socket_options=self.socket_options
+                )
+            except socket.timeout:
+                error = ConnectTimeoutError(self, "Connection to {} timed out. (connect timeout={})".format(self.host, self.timeout))
+            except OSError as e:
+                error = NewConnectionError(self, "Failed to establish a new connection: {}".format(e))
+
+        raise error
+
+
+class CachedDnsHTTPConnection(CachedDnsConnectionMixin, HTTPConnection):
+    pass
+
+
+class CachedDnsHTTPSConnection(CachedDnsConnectionMixin, HTTPSConnection):
+    pass
+
+
+class ConnectionPoolMixin(object):
+    dns_cache = None
+
+    def _new_conn(self):
+        conn = super()._new_conn()
+        conn.dns_cache = self.dns_cache
+
+        return conn
+
+    def urlopen(self, method, url, pool_timeout=None, **kwargs):
+        # requests never passes a pool timeout, waiting for a connection from a full pool is
+        # bounded by the request's connect timeout instead
+        if pool_timeout is None:
+            timeout = kwargs.get("timeout")
+            if isinstance(timeout, Timeout): timeout = timeout.connect_timeout
+            if isinstance(timeout, (int, float)): pool_timeout = timeout
+
+        return super().urlopen(method, url, pool_timeout=pool_timeout, **kwargs)
+
+
+class HttpConnectionPool(ConnectionPoolMixin, HTTPConnectionPool):
+    ConnectionCls = CachedDnsHTTPConnection
+
+
+class HttpsConnectionPool(ConnectionPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = CachedDnsHTTPSConnection
+
+
+class CachedDnsPoolManager(PoolManager):
+    def __init__(self, dns_cache=None, **kwargs):
+        PoolManager.__init__(self, **kwargs)
+
+        self.dns_cache = dns_cache
+        self.pool_classes_by_scheme = { "http": HttpConnectionPool, "https": HttpsConnectionPool }
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = PoolManager._new_pool(self, scheme, host, port, request_context)
+        pool.dns_cache = self.dns_cache
+
+        return pool
+
+
+class CachedDnsAdapter(HTTPAdapter):
+    def __init__(self, dns_cache=None, **kwargs):
+        # set first, HTTPAdapter creates the pool manager in its constructor
+        self.dns_cache = dns_cache
+
+        HTTPAdapter.__init__(self, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+
+        self.poolmanager = CachedDnsPoolManager(
+            dns_cache=self.dns_cache,
+            num_pools=connections,
+            maxsize=maxsize,
+            block=block,
+            **pool_kwargs
+        )
+
+    def send(self, request, **kwargs):
+        try: return HTTPAdapter.send(self, request, **kwargs)
+        except EmptyPoolError as error:
+            # every connection to the origin stayed busy for the whole timeout
+            raise ConnectTimeout(error, request=request)
+
+
+class HttpClient(object):
+    def __init__(self, pool_connections=100, pool_maxsize=10, dns_ttl=60):
+        self.dns_cache = DnsCache(ttl=dns_ttl) if dns_ttl else None
+
+        # one connection pool per origin (scheme, host, port), each holding at most
+        # `pool_maxsize` keep-alive connections. requests past that wait for a free one, for
+        # as long as their timeout
+        self.adapter = CachedDnsAdapter(
+            dns_cache=self.dns_cache,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+            max_retries=0
+        )
+
+        self.session = Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def get_stats(self):
+        pools = self.adapter.poolmanager.pools
+        origins = { }
+
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None: continue
+
+            origin = "{}://{}:{}".format(pool.scheme, pool.host, pool.port)
+            connections = pool.num_connections
+            requests = pool.num_requests
+
+            origins[origin] = {
+                "connections": connections,
+                "requests": requests,
+                "hits": max(requests - connections, 0),
+                "misses": connections
+            }
+
+        return {
+            "hits": sum([ stats["hits"] for origin, stats in origins.items() ]),
+            "misses": sum([ stats["misses"] for origin, stats in origins.items() ]),
+            "origins": origins,
+            "dns": self.dns_cache.get_stats() if self.dns_cache else None
+        }
@@ -0,0 +1,157 @@
+import time
+
+from contextlib import contextmanager
+from queue import Empty, LifoQueue
+from threading import Lock, local
+
+
+class PooledConnection(object):
+    def __init__(self, db):
+        self.db = db
+        self.statements = { } # sql -> prepared statement on this connection
+
+    def prepare(self, sql):
+        statement = self.statements.get(sql)
+
+        if statement is None:
+            statement = self.db.prepare(sql)
+            self.statements[sql] = statement
+
+        return statement
+
+
+class PooledStatement(object):
+    # stands in for a py-postgresql prepared statement, every call borrows a connection from
+    # the pool (or uses the one the current transaction is bound to) and runs the statement
+    # prepared on that connection
+    def __init__(self, pool, sql):
+        self.pool = pool
+        self.sql = sql
+
+    def __call__(self, *args):
+        with self.pool.connection() as connection:
+            return connection.prepare(self.sql)(*args)
+
+    def column(self, *args):
+        with self.pool.connection() as connection:
+            return connection.prepare(self.sql).column(*args)
+
+    def first(self, *args):
+        with self.pool.connection() as connection:
+            return connection.prepare(self.sql).first(*args)
+
+    def load_rows(self, rows):
+        with self.pool.connection() as connection:
+            return connection.prepare(self.sql).load_rows(rows)
+
+    def rows(self, *args):
+        with self.pool.connection() as connection:
+            # rows is a lazy cursor, read it before the connection goes back to the pool
+            return list(connection.prepare(self.sql).rows(*args))
+
+
+class ConnectionPool(object):
+    def __init__(self, connect, size=10):
+        self.size = size
+
+        self._connect = connect
+        self._idle = LifoQueue()
+        self._lock = Lock()
+        self._local = local()
+        self._opened = 0
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0
+        self.max_wait_time = 0
+
+    def connect(self):
+        # a dedicated connection that is never pooled, for LISTEN and the like
+        return self._connect()
+
+    @contextmanager
+    def connection(self):
+        bound = getattr(self._local, "connection", None)
+
+        if bound is not None:
+            yield bound
+            return
+
+        connection = self._checkout()
+
+        try: yield connection
+        finally: self._checkin(connection)
+
+    def _discard(self, connection):
+        with self._lock: self._opened = self._opened - 1
+
+    def get_stats(self):
+        return {
+            "size": self.size,
+            "open": self._opened,
+            "idle": self._idle.qsize(),
+            "in_use": self._opened - self._idle.qsize(),
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "wait_time": self.wait_time,
+            "max_wait_time": self.max_wait_time
+        }
+
+    def prepare(self, sql):
+        return PooledStatement(self, sql)
+
+    @contextmanager
+    def xact(self):
+        # statements run inside the transaction (on the same thread/greenlet) use its connection
+        bound = getattr(self._local, "connection", None)
+
+        if bound is not None:
+            with bound.db.xact(): yield
+            return
+
+        connection = self._checkout()
+        self._local.connection = connection
+
+        try:
+            with connection.db.xact(): yield
+        finally:
+            self._local.connection = None
+            self._checkin(connection)
+
+    def _checkin(self, connection):
+        if connection.db.closed: self._discard(connection)
+        else: self._idle.put(connection)
+
+    def _checkout(self):
+        started_at = time.time()
+        self.checkouts = self.checkouts + 1
+
+        while True:
+            try: connection = self._idle.get_nowait()
+            except Empty: break
+
+            if not connection.db.closed: return connection
+            self._discard(connection)
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open: self._opened = self._opened + 1
+
+        if can_open:
+            try: return PooledConnection(self._connect())
+            except Exception:
+                with self._lock: self._opened = self._opened - 1
+                raise
+
+        connection = self._idle.get()
+
+        if connection.db.closed:
+            self._discard(connection)
+            return self._checkout()
+
+        wait_time = time.time() - started_at
+        self.waits = self.waits + 1
+        self.wait_time = self.wait_time + wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+
+        return connection
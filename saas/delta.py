@@ -0,0 +1,112 @@
+from collections import Counter
+
+# spectators watching in delta mode get a keyframe (the full `Game.to_json` frame) when they
+# start watching and every `Game.KEYFRAME_INTERVAL` frames, and diffs in between:
+#
+# {
+#   "type": "delta", "seq": 42,
+#   "turnNumber": 12, "viewers": 3, "errors": {...}, "daemon": {...},  <- only when changed
+#   "board": {
+#     "width": 20, "height": 20,                                     <- only when changed
+#     "snakes": {
+#       "added": [<snake>], "removed": ["<id>"],
+#       "changed": { "<id>": { "head": [<segment>], "tail": 1, "body": [...], "health": 100, ... } }
+#     },
+#     "deadSnakes": { same as snakes },
+#     "food": { "added": [<coord>], "removed": [<coord>] },
+#     "teleporters": {...}, "walls": {...}
+#   }
+# }
+#
+# `head` segments are prepended to the body and `tail` segments dropped from the end, `body`
+# replaces it entirely when the change can't be expressed that way. a frame whose `seq` isn't
+# the previous one + 1 means something was missed, the client should ask for a `keyframe`
+
+MAX_HEAD_SEGMENTS = 4
+
+FRAME_FIELDS = ["turnNumber", "viewers", "errors", "daemon"]
+BOARD_FIELDS = ["width", "height"]
+SNAKE_LISTS = ["snakes", "deadSnakes"]
+ENTITY_LISTS = ["food", "teleporters", "walls"]
+
+
+def diff_body(previous, current):
+    for head_count in range(0, min(len(current), MAX_HEAD_SEGMENTS) + 1):
+        rest = current[head_count:]
+
+        if len(rest) <= len(previous) and previous[:len(rest)] == rest:
+            return { "head": current[:head_count], "tail": len(previous) - len(rest) }
+
+    return { "body": current }
+
+
+def diff_snake(previous, current):
+    changes = { }
+
+    for key, value in current.items():
+        if key == "coords": continue
+        if previous.get(key) != value: changes[key] = value
+
+    if previous["coords"] != current["coords"]:
+        changes.update(diff_body(previous["coords"], current["coords"]))
+
+    return changes
+
+
+def diff_snake_list(previous, current):
+    previous_snakes = { snake["id"]: snake for snake in previous }
+    current_snakes = { snake["id"]: snake for snake in current }
+
+    changed = { }
+
+    for snake_id, snake in current_snakes.items():
+        if snake_id not in previous_snakes: continue
+
+        changes = diff_snake(previous_snakes[snake_id], snake)
+        if changes: changed[snake_id] = changes
+
+    return {
+        "added": [ snake for snake_id, snake in current_snakes.items() if snake_id not in previous_snakes ],
+        "removed": [ snake_id for snake_id in previous_snakes.keys() if snake_id not in current_snakes ],
+        "changed": changed
+    }
+
+
+def entity_key(entity):
+    return tuple(sorted(entity.items()))
+
+
+def diff_entity_list(previous, current):
+    previous_entities = Counter([ entity_key(entity) for entity in previous ])
+    current_entities = Counter([ entity_key(entity) for entity in current ])
+
+    return {
+        "added": [ dict(key) for key in (current_entities - previous_entities).elements() ],
+        "removed": [ dict(key) for key in (previous_entities - current_entities).elements() ]
+    }
+
+
+def diff_frames(previous, current):
+    delta = { }
+
+    for key in FRAME_FIELDS:
+        if previous.get(key) != current.get(key): delta[key] = current.get(key)
+
+    previous_board = previous.get("board", { })
+    current_board = current.get("board", { })
+    board_delta = { }
+
+    for key in BOARD_FIELDS:
+        if previous_board.get(key) != current_board.get(key): board_delta[key] = current_board.get(key)
+
+    for key in SNAKE_LISTS:
+        changes = diff_snake_list(previous_board.get(key, []), current_board.get(key, []))
+        if changes["added"] or changes["removed"] or changes["changed"]: board_delta[key] = changes
+
+    for key in ENTITY_LISTS:
+        changes = diff_entity_list(previous_board.get(key, []), current_board.get(key, []))
+        if changes["added"] or changes["removed"]: board_delta[key] = changes
+
+    if board_delta: delta["board"] = board_delta
+
+    return delta
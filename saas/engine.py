@@ -0,0 +1,196 @@
+import random
+
+from .board import Board
+from .constants import SPAWN_STRATEGY_RANDOM
+from .models import Snake
+from .patch import get_move_request
+
+MOVES = [Board.MOVE_UP, Board.MOVE_DOWN, Board.MOVE_LEFT, Board.MOVE_RIGHT]
+
+MOVE_VECTORS = {
+    Board.MOVE_UP: (0, -1),
+    Board.MOVE_DOWN: (0, 1),
+    Board.MOVE_LEFT: (-1, 0),
+    Board.MOVE_RIGHT: (1, 0)
+}
+
+# the parts of a game row the rules read
+DEFAULT_RULES = {
+    "boardFoodCount": 4,
+    "boardFoodStrategy": SPAWN_STRATEGY_RANDOM,
+    "boardGoldCount": 0,
+    "boardGoldWinningThreshold": 5,
+    "boardHasGold": False,
+    "boardHasTeleporters": False,
+    "boardTeleporterCount": 0,
+    "pinTail": False,
+    "turnLimit": 0
+}
+
+
+def create_snake(snake_id, name=None, color="#000000", api_version="client"):
+    return Snake({
+        "id": snake_id,
+        "api_version": api_version,
+        "defaultColor": color,
+        "devUrl": None,
+        "isBountySnake": False,
+        "name": name or snake_id,
+        "url": None
+    })
+
+
+def get_safe_moves(board, snake):
+    head_x, head_y = snake.head_position
+    moves = []
+
+    for move in MOVES:
+        dx, dy = MOVE_VECTORS[move]
+        x, y = head_x + dx, head_y + dy
+
+        if x < 0 or x >= board.width or y < 0 or y >= board.height: continue
+
+        value, thing = board.get_at_position(x, y)
+        if value in [Board.BOARD_TYPE_SNAKE, Board.BOARD_TYPE_WALL]: continue
+
+        moves.append(move)
+
+    return moves
+
+
+def random_bot(engine, snake):
+    return random.choice(get_safe_moves(engine.board, snake) or MOVES)
+
+
+def greedy_bot(engine, snake):
+    # heads for the closest food, avoiding anything that kills it this turn
+    moves = get_safe_moves(engine.board, snake)
+    if not moves: return snake.next_move
+
+    food = engine.board.get_food()
+    if not food: return random.choice(moves)
+
+    head_x, head_y = snake.head_position
+    target = min(food, key=lambda f: abs(f["x"] - head_x) + abs(f["y"] - head_y))
+
+    return min(moves, key=lambda move: (
+        abs(head_x + MOVE_VECTORS[move][0] - target["x"]) +
+        abs(head_y + MOVE_VECTORS[move][1] - target["y"])
+    ))
+
+
+def json_bot(policy):
+    # hands `policy` the same request body an http snake would get, for timing serialization too
+    def bot(engine, snake):
+        return policy(get_move_request(engine.board, engine, snake))
+
+    return bot
+
+
+BOTS = {
+    "greedy": greedy_bot,
+    "random": random_bot
+}
+
+
+class Engine(object):
+    # steps a Board the way Game.step_game does, without any of the services. bots are
+    # callables taking (engine, snake) and returning a move, anything else (including an
+    # exception) keeps the snake's previous move like a failed /move request would
+    #
+    # snakes keep moving on the board after they die (same as a real game), the engine
+    # records the first death of each snake itself and stops asking its bot for moves
+    def __init__(self, bots, width=11, height=11, rules=None, game_id="headless"):
+        self.game_id = game_id
+        self.game = dict(DEFAULT_RULES)
+        self.game.update(rules or { })
+
+        self.bots = bots
+        self.turn_number = 0
+        self.deaths = { } # snake_id -> death
+        self.bot_errors = 0
+
+        snakes = { snake_id: create_snake(snake_id) for snake_id in bots.keys() }
+
+        self.board = Board(snakes, width=width, height=height)
+        self.board.spawn_random_food(self.game["boardFoodCount"])
+
+        if self.game["boardHasGold"]:
+            self.board.spawn_random_gold(self.game["boardGoldCount"])
+
+        if self.game["boardHasTeleporters"]:
+            self.board.spawn_random_teleporters(self.game["boardTeleporterCount"])
+
+    def get_alive_snakes(self):
+        return { snake_id: snake for snake_id, snake in self.board.get_snakes().items() if snake_id not in self.deaths }
+
+    def get_result(self):
+        snakes = self.board.get_snakes()
+        alive = self.get_alive_snakes()
+
+        if len(alive) == 1: winner = next(iter(alive))
+        elif alive: winner = None # turn limit or gold, more than one snake standing
+        else:
+            # everybody died, the last to go wins unless they went together
+            last_turn = max([ death["turn"] for snake_id, death in self.deaths.items() ])
+            last = [ snake_id for snake_id, death in self.deaths.items() if death["turn"] == last_turn ]
+            winner = last[0] if len(last) == 1 else None
+
+        gold_winners = [ snake_id for snake_id, snake in snakes.items() if snake.gold >= self.game["boardGoldWinningThreshold"] ]
+        if self.game["boardHasGold"] and len(gold_winners) == 1: winner = gold_winners[0]
+
+        return {
+            "turns": self.turn_number,
+            "winner": winner,
+            "deaths": dict(self.deaths),
+            "scores": { snake_id: snake.score for snake_id, snake in snakes.items() },
+            "lengths": { snake_id: snake.length for snake_id, snake in snakes.items() },
+            "bot_errors": self.bot_errors
+        }
+
+    def is_finished(self):
+        snakes = self.board.get_snakes()
+        alive = self.get_alive_snakes()
+
+        if self.game["turnLimit"] and self.turn_number >= self.game["turnLimit"]:
+            return True
+
+        if len(alive) <= (1 if len(snakes) > 1 else 0):
+            return True
+
+        if self.game["boardHasGold"] and [ snake for snake_id, snake in snakes.items() if snake.gold >= self.game["boardGoldWinningThreshold"] ]:
+            return True
+
+        return False
+
+    def run(self, max_turns=None):
+        while not self.is_finished() and (max_turns is None or self.turn_number < max_turns):
+            self.step()
+
+        return self.get_result()
+
+    def step(self):
+        snakes = self.board.get_snakes()
+
+        for snake_id, snake in self.get_alive_snakes().items():
+            if not snake.length: continue
+
+            try: move = self.bots[snake_id](self, snake)
+            except Exception:
+                self.bot_errors = self.bot_errors + 1
+                continue
+
+            if move in MOVE_VECTORS: snake.next_move = move
+            else: self.bot_errors = self.bot_errors + 1
+
+        self.board.update(self, snakes, tick_snakes=True)
+
+        # top up the food
+        if self.board.get_food_count() < self.game["boardFoodCount"]:
+            self.board.spawn_food_by_strat(self.game["boardFoodStrategy"])
+
+        self.turn_number = self.turn_number + 1
+
+        for snake_id, snake in snakes.items():
+            if snake.death and snake_id not in self.deaths:
+                self.deaths[snake_id] = dict(snake.death)
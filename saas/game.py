@@ -1,21 +1,26 @@
 import time
-import requests
 import json
 import base64
+import itertools
+import gevent
 
 from flask_socketio import join_room, leave_room
 from queue import Empty, PriorityQueue
-from requests.exceptions import HTTPError, ConnectionError as RequestsConnectionError
-from threading import Event, Thread
+from requests.exceptions import HTTPError, Timeout, ConnectionError as RequestsConnectionError
+from threading import Event, Lock
 
-from . import app, postgres, redis, socketio
+from . import app, history_writer, http_client, metrics, postgres, profiler, scheduler, socketio, status_writer, viewers
 from . import models
-from .queries import clone_game, get_child_games, get_game_prepared, get_game_snakes_prepared, set_game_status, set_snake_place
+from .queries import clone_game, get_child_games, get_game_prepared, get_game_snakes_prepared, set_game_status, set_snake_places
+from .binary import FrameEncoder
 from .board import Board
+from .delta import diff_frames
+from .metrics import LATENCY_DAEMON, LATENCY_SNAKE, PHASE_BOARD, PHASE_BOUNTY, PHASE_DAEMON, PHASE_EMIT, PHASE_HISTORY, \
+    PHASE_MOVES, PHASE_SERIALIZE, PHASE_SPAWN, PHASE_TURN
 from .patch import get_move_request, get_start_request
 
 
-class Game(Thread):
+class Game(object):
     api_version = "client"
 
     MODE_AUTO = "MODE_AUTO"
@@ -28,29 +33,53 @@ class Game(Thread):
     STATUS_STARTED = "STARTED"
     STATUS_STOPPED = "STOPPED"
 
+    STREAM_JSON = "json"
+    STREAM_DELTA = "delta"
+    STREAM_BINARY = "binary"
+    STREAM_BINARY_COMPRESSED = "binary-zlib"
+    STREAMS = [STREAM_JSON, STREAM_DELTA, STREAM_BINARY, STREAM_BINARY_COMPRESSED]
+
+    KEYFRAME_INTERVAL = 50 # in frames
+
     WALL_SPAWN_RATE = 10 # in seconds
+    IDLE_TIMEOUT = 5 # in seconds
 
     def __init__(self, game_id, board=None, start_on_turn_number=0):
-        Thread.__init__(self)
-
         self.action_queue = PriorityQueue()
+        self.action_counter = itertools.count()
+        self.action_lock = Lock()
         self.stop_game_event = Event()
 
+        self.last_action_at = time.time()
+        self.processing_actions = False
+        self.started = False
+        self.tick = None
+
+        # auto mode ticks are scheduled against absolute deadlines, turns that run past the
+        # next deadline are counted instead of pushing every following turn back
+        self.next_tick_at = None
+        self.tick_overruns = 0
+        self.tick_overrun_time = 0
+        self.tick_lag = 0
+
         self.board = board
         self.game_daemon = None
         self.game = None
         self.game_id = game_id
         self.mode = Game.MODE_MANUAL
         self.turn_number = start_on_turn_number
-        self.history = []
+
+        self.watchers = { } # sid -> stream
+        self.frame_seq = 0
+        self.keyframe_seq = 0
+        self.last_frame = None
+        self.frame_encoder = FrameEncoder()
 
         self._initialized_called = False
 
         self.sync_game()
 
-        self.action_queue.put((1, self.initialize_game, {
-            "override_board": board is None
-        }))
+        self.enqueue(self.initialize_game, override_board=board is None)
 
     def apply_daemon_update(self, update):
         app.logger.info("daemon updated %s %s", self.game_id, json.dumps(update))
@@ -70,7 +99,7 @@ class Game(Thread):
 
     def check_bounty_conditions(self, snake):
         try:
-            response = requests.post(
+            response = http_client.post(
                 "{}/bounty/check".format(snake.url),
                 headers={ "Content-Type": "application/json" },
                 timeout=self.game["responseTime"],
@@ -88,53 +117,48 @@ class Game(Thread):
 
         return
 
-    def disconnect(self):
-        leave_room(self.game_id)
+    def disconnect(self, sid):
+        stream = self.watchers.pop(sid, Game.STREAM_JSON)
 
-        current = int(redis.get("game:viewer_count:{}".format(self.game_id)))
+        leave_room(self.game_id, sid=sid)
+        leave_room(self.get_stream_room(stream), sid=sid)
 
-        if current <= 1: redis.set("game:viewer_count:{}".format(self.game_id), 0)
-        else: redis.decr("game:viewer_count:{}".format(self.game_id))
+        # a stopped game's count is gone, the game replacing it counts its own viewers
+        if not self.is_stopped(): viewers.set(self.game_id, len(self.watchers))
 
         self.update_clients()
 
     def finish_game(self):
         snakes = self.board.get_snakes()
+        sorted_snakes = [snake for snake_id, snake in snakes.items()]
+
+        if self.game["gameType"] == "TYPE_SCORE":
+            sorted_snakes = sorted(sorted_snakes, key=lambda snake: snake.score)
+        elif self.game["gameType"] == "TYPE_PLACEMENT":
+            sorted_snakes = list(reversed(sorted(
+                sorted_snakes,
+                # cmp=lambda a, b:
+                key=lambda snake: 0 if not snake.death else snake.death["turn"]
+            )))
+
+        # a pending status must not be written over the final one
+        status_writer.discard(self.game_id)
 
         with postgres.xact():
             set_game_status(Game.STATUS_COMPLETED, self.game_id)
-            self.sync_game()
+            self.game["status"] = Game.STATUS_COMPLETED
 
-            if self.game["gameType"] == "TYPE_SCORE":
-                sorted_snakes = sorted(
-                    [snake for snake_id, snake in snakes.items()],
-                    key=lambda snake: snake.score
-                )
-            elif self.game["gameType"] == "TYPE_PLACEMENT":
-                sorted_snakes = reversed(sorted(
-                    [snake for snake_id, snake in snakes.items()],
-                    # cmp=lambda a, b:
-                    key=lambda snake: 0 if not snake.death else snake.death["turn"]
-                ))
-
-            for place, snake in enumerate(sorted_snakes):
-                set_snake_place(place + 1, snake.id, self.game_id)
-
-        for snake in snakes.items():
-            try:
-                response = requests.post(
-                    f"{snake.get_url(dev_mode=self.game['devMode'])}/end",
-                    headers={ "Content-Type": "application/json" },
-                    timeout=self.game["responseTime"],
-                    json={ "winner_id": sorted_snakes[0].id, "you": snake.id }
-                )
-            except (RequestsConnectionError, HTTPError) as error:
-                app.logger.info(
-                    "[%s] /end (%s): %s",
-                    self.game_id,
-                    snake.id,
-                    error
-                )
+            set_snake_places(
+                [snake.id for snake in sorted_snakes],
+                list(range(1, len(sorted_snakes) + 1)),
+                self.game_id
+            )
+
+        winner_id = sorted_snakes[0].id if sorted_snakes else None
+
+        # nobody waits on /end, spectators get redirected right away
+        for snake in sorted_snakes:
+            gevent.spawn(self.notify_snake_end, snake, winner_id)
 
         self.redirect_to_child()
 
@@ -145,7 +169,7 @@ class Game(Thread):
     def get_daemon_update(self):
         try:
             app.logger.info("[%s] daemon posting %s", self.game_id, self.game["daemon_url"])
-            response = requests.post(
+            response = http_client.post(
                 self.game["daemon_url"],
                 timeout=self.game["responseTime"],
                 headers={ "Content-Type": "application/json" },
@@ -155,13 +179,7 @@ class Game(Thread):
             if response.status_code == 200:
                 response_json = response.json()
 
-                time_elapsed = response.elapsed.total_seconds()
-
-                pipe = redis.pipeline()
-                pipe.zincrby("daemon:response_time:{}".format(self.game["daemon_id"]), "count")
-                pipe.zincrby("daemon:response_time:{}".format(self.game["daemon_id"]), "sum", time_elapsed)
-                pipe.zincrby("daemon:response_time:{}".format(self.game["daemon_id"]), "sumsq", time_elapsed * time_elapsed)
-                pipe.execute()
+                metrics.record_latency(LATENCY_DAEMON, self.game["daemon_id"], response.elapsed.total_seconds(), game_id=self.game_id)
 
                 return response_json
         except (ValueError, RequestsConnectionError, HTTPError) as error:
@@ -178,6 +196,9 @@ class Game(Thread):
         snakes = get_game_snakes_prepared.rows(self.game_id)
         return { str(snake_data["id"]): models.Snake(snake_data) for snake_data in snakes }
 
+    def get_stream_room(self, stream):
+        return "{}:{}".format(self.game_id, stream)
+
     def get_snake_next_move(self, snake):
         app.logger.info("[%s] get_snake_next_move (%s)", self.game_id, snake.name)
         error = None
@@ -185,26 +206,61 @@ class Game(Thread):
         try:
             snake_url = snake.get_url(self.game["devMode"])
 
-            response = requests.post(
+            response = http_client.post(
                 "{}/move".format(snake_url),
                 timeout=self.game["responseTime"],
                 headers={ "Content-Type": "application/json" },
                 json=get_move_request(self.board, self, snake)
             )
 
+            metrics.record_latency(LATENCY_SNAKE, snake_url, response.elapsed.total_seconds(), game_id=self.game_id)
+
             if response.status_code == 200:
                 response_json = response.json()
                 snake.handle_move_response(response_json)
-        except (ValueError, RequestsConnectionError, HTTPError) as m_error:
+        except (ValueError, RequestsConnectionError, HTTPError, Timeout) as m_error:
             app.logger.info("[%s] get_snake_next_move error (%s): %s", self.game_id, snake.name, m_error)
-            snake.error = m_error
+            snake.error = str(m_error)
             error = m_error
 
+            if isinstance(m_error, Timeout):
+                metrics.record_latency(LATENCY_SNAKE, snake.get_url(self.game["devMode"]), self.game["responseTime"], game_id=self.game_id)
+
         return snake, error
 
-    def initialize_game(self, override_board=True):
-        self.sync_game()
+    def get_snake_next_moves(self, snakes):
+        errors = { }
+
+        # all /move requests go out at once and share a single deadline, snakes that
+        # haven't answered by then keep their previous move
+
+        requests_in_flight = {
+            snake_id: gevent.spawn(self.get_snake_next_move, snake)
+            for snake_id, snake in snakes.items()
+        }
+
+        gevent.joinall(list(requests_in_flight.values()), timeout=self.game["responseTime"])
+
+        for snake_id, request in requests_in_flight.items():
+            snake = snakes[snake_id]
+
+            if not request.ready():
+                # kill the request before it can apply a late move to the snake
+                request.kill()
+
+                app.logger.info("[%s] get_snake_next_move timed out (%s)", self.game_id, snake.name)
+                metrics.record_latency(LATENCY_SNAKE, snake.get_url(self.game["devMode"]), self.game["responseTime"], game_id=self.game_id)
+                snake.error = "timed out"
+                errors[snake_id] = snake.error
+            elif not request.successful():
+                errors[snake_id] = str(request.exception)
+            else:
+                snake, error = request.value
+                if error: errors[snake_id] = str(error)
 
+        return errors
+
+    def initialize_game(self, override_board=True):
         if self.game["status"] == Game.STATUS_COMPLETED:
             return
 
@@ -248,7 +304,9 @@ class Game(Thread):
                 if self.game["boardHasTeleporters"]:
                     self.board.spawn_random_teleporters(self.game["boardTeleporterCount"] - self.board.get_teleporter_count())
 
-        self.history = []
+        if override_board:
+            history_writer.reset(self.game_id)
+
         snakes = self.board.get_snakes()
 
         if not snakes:
@@ -273,7 +331,7 @@ class Game(Thread):
     def initialize_snake(self, snake):
         try:
             snake_url = snake.get_url(self.game["devMode"])
-            response = requests.post(
+            response = http_client.post(
                 "{}/start".format(snake_url),
                 headers={ "Content-Type": "application/json" },
                 timeout=(self.game["responseTime"] * 2),
@@ -288,19 +346,42 @@ class Game(Thread):
 
         return snake
 
+    def invalidate(self):
+        # the configuration changed in the database, reload it before the next action
+        self.enqueue(self.sync_game, priority=0)
+
+    def notify_snake_end(self, snake, winner_id):
+        try:
+            http_client.post(
+                "{}/end".format(snake.get_url(self.game["devMode"])),
+                headers={ "Content-Type": "application/json" },
+                timeout=self.game["responseTime"],
+                json={ "winner_id": winner_id, "you": snake.id }
+            )
+        except (RequestsConnectionError, HTTPError, Timeout) as error:
+            app.logger.info(
+                "[%s] /end (%s): %s",
+                self.game_id,
+                snake.id,
+                error
+            )
+
     def pause_game(self):
-        set_game_status(Game.STATUS_STOPPED, self.game_id)
-        self.sync_game()
+        self.cancel_tick()
+        self.set_status(Game.STATUS_STOPPED)
 
     def play_game(self):
         if self.game["status"] == Game.STATUS_IN_PROGRESS:
             self.mode = Game.MODE_AUTO
             return
 
-        set_game_status(Game.STATUS_IN_PROGRESS, self.game_id)
-        self.sync_game()
+        self.set_status(Game.STATUS_IN_PROGRESS)
         self.step_game()
 
+    def record_history(self):
+        # serialized and written to the database in batches by the history writer
+        history_writer.append(self.game_id, self.turn_number, self.board.to_json(api_version=Game.api_version))
+
     def redirect_to_child(self):
         app.logger.info("%s complete, redirecting to child game", self.game_id)
         child_game = get_child_games.first(self.game_id)
@@ -320,51 +401,117 @@ class Game(Thread):
 
     def restart_game(self):
         app.logger.info("restarting game %s", self.game_id)
-        set_game_status(Game.STATUS_RESTARTED, self.game_id)
+        self.set_status(Game.STATUS_RESTARTED)
         self.turn_number = 0
-        self.sync_game()
         self.initialize_game()
 
-    def run(self):
-        app.logger.info("thread starting")
-        self.stop_game_event.clear()
+    def cancel_tick(self):
+        if self.tick: self.tick.cancel()
+
+        self.tick = None
+        self.next_tick_at = None
 
-        # try: tick_rate = int(self.game["tickRate"])
-        # except ValueError: tick_rate = None
+    def enqueue(self, action, priority=1, **args):
+        # the counter keeps actions with the same priority in order
+        self.action_queue.put((priority, next(self.action_counter), action, args))
+        self.schedule_actions()
 
-        # if tick_rate is None: tick_rate = 1000
+    def is_idle(self):
+        return self.started and not self.processing_actions and self.tick is None and \
+            self.action_queue.empty() and time.time() - self.last_action_at > Game.IDLE_TIMEOUT
 
-        last_command = time.time()
-        while not self.stop_game_event.isSet():
-            try:
-                priority, action, args = self.action_queue.get(True, 0.05)
-                app.logger.info("processing %s (priority: %d)", action.__name__, priority)
+    def is_stopped(self):
+        return self.stop_game_event.is_set()
 
-                action(**args)
+    def stop_if_idle(self):
+        # games don't hold a thread, they're just considered stopped once idle for long enough.
+        # returns whether the game stopped just now
+        if self.is_stopped() or not self.is_idle(): return False
 
-                last_command = time.time()
+        app.logger.info("[%s] idle, stopping", self.game_id)
+        self.stop_game_event.set()
+
+        return True
+
+    def process_actions(self):
+        while True:
+            try: priority, _, action, args = self.action_queue.get_nowait()
             except Empty:
-                pass
+                with self.action_lock:
+                    if self.action_queue.empty():
+                        self.processing_actions = False
+                        return
+
+                continue
+
+            app.logger.info("processing %s (priority: %d)", action.__name__, priority)
+
+            try: action(**args)
+            except Exception:
+                app.logger.exception("[%s] %s failed", self.game_id, action.__name__)
+
+            self.last_action_at = time.time()
+
+    def schedule_actions(self):
+        # at most one worker processes a game's actions at a time
+        with self.action_lock:
+            if not self.started or self.processing_actions or self.action_queue.empty(): return
+            self.processing_actions = True
+
+        scheduler.call_soon(self.process_actions)
+
+    def schedule_tick(self, turn_started_at):
+        if self.tick: self.tick.cancel()
 
-            time_since_last_command = time.time() - last_command
+        now = time.time()
+        tick_period = self.game["tickRate"] / 1000
 
-            if time_since_last_command > 5:
-                self.stop_game_event.set()
+        # the first auto turn has no deadline, it started whenever it was asked to
+        next_tick_at = (self.next_tick_at or turn_started_at) + tick_period
 
-        app.logger.info("thread exiting")
+        if next_tick_at < now:
+            overrun = now - next_tick_at
+
+            self.tick_overruns = self.tick_overruns + 1
+            self.tick_overrun_time = self.tick_overrun_time + overrun
+
+            app.logger.info("[%s] turn %d overran its tick by %.3fs", self.game_id, self.turn_number, overrun)
+            next_tick_at = now
+
+        self.next_tick_at = next_tick_at
+        self.tick = scheduler.call_at(next_tick_at, self.tick_game)
+
+    def set_status(self, status):
+        # the cached row is updated right away, the database is written behind
+        self.game["status"] = status
+        status_writer.set_status(self.game_id, status)
+
+    def start(self):
+        if self.started: return
+
+        app.logger.info("[%s] starting", self.game_id)
+        self.started = True
+        self.last_action_at = time.time()
+        self.schedule_actions()
+
+    def tick_game(self):
+        self.tick = None
+        self.enqueue(self.step_game, allow_stepping=True)
 
     def start_game(self, mode=MODE_MANUAL):
         app.logger.info("starting game with mode: %s", mode)
-        self.history.append(self.board.to_json(api_version=Game.api_version))
+        self.record_history()
         self.step_game()
 
     def step_game(self, allow_stepping = False):
+        turn_started_at = time.time()
         snakes = self.board.get_snakes()
-        errors = { }
+
+        if allow_stepping and self.next_tick_at is not None:
+            self.tick_lag = turn_started_at - self.next_tick_at
 
         if self.game["status"] != Game.STATUS_IN_PROGRESS:
-            set_game_status(Game.STATUS_IN_PROGRESS, self.game_id)
-            self.sync_game()
+            self.set_status(Game.STATUS_IN_PROGRESS)
 
         bounty_snakes = {
             snake_id: snake for snake_id, snake in snakes.items()
@@ -372,54 +519,65 @@ class Game(Thread):
         }
 
         if self.game["daemon_id"] is not None:
-            self.get_and_apply_daemon_update()
+            with metrics.time_phase(PHASE_DAEMON):
+                self.get_and_apply_daemon_update()
 
-        for snake_id, bounty_snake in bounty_snakes.items():
-            bounty = self.check_bounty_conditions(bounty_snake)
-
-        for snake_id, snake in snakes.items():
-            snake, error = self.get_snake_next_move(snake)
+        with metrics.time_phase(PHASE_BOUNTY):
+            for snake_id, bounty_snake in bounty_snakes.items():
+                bounty = self.check_bounty_conditions(bounty_snake)
 
-            if error: errors[snake.id] = error.message
+        with metrics.time_phase(PHASE_MOVES):
+            errors = self.get_snake_next_moves(snakes)
 
-        self.board.update(self, snakes, tick_snakes=True)
+        with metrics.time_phase(PHASE_BOARD):
+            self.board.update(self, snakes, tick_snakes=True)
 
-        # top up the food
-        if self.board.get_food_count() < self.game["boardFoodCount"]:
-            spawn_count = self.game["boardFoodCount"] - self.board.get_food_count()
-            self.board.spawn_food_by_strat(self.game["boardFoodStrategy"])
+        with metrics.time_phase(PHASE_SPAWN):
+            # top up the food
+            if self.board.get_food_count() < self.game["boardFoodCount"]:
+                spawn_count = self.game["boardFoodCount"] - self.board.get_food_count()
+                self.board.spawn_food_by_strat(self.game["boardFoodStrategy"])
 
-        if self.game["boardHasGold"] and self.board.get_gold_count() < self.game["boardGoldCount"]:
-            if self.board.last_gold_spawn and time.time() - self.board.last_gold_spawn >= (self.game["boardGoldRespawnInterval"]):
-                pass
-                # if self.game["boardGoldStrategy"] == Game.SPAWN_STRATEGY_RANDOM: self.board.spawn_random_gold(count=1)
-                # else: pass
+            if self.game["boardHasGold"] and self.board.get_gold_count() < self.game["boardGoldCount"]:
+                if self.board.last_gold_spawn and time.time() - self.board.last_gold_spawn >= (self.game["boardGoldRespawnInterval"]):
+                    pass
+                    # if self.game["boardGoldStrategy"] == Game.SPAWN_STRATEGY_RANDOM: self.board.spawn_random_gold(count=1)
+                    # else: pass
 
-        if self.game["boardHasWalls"] and self.board.get_wall_count() / (self.board.width * self.board.height) < 0.10:
-            if self.board.last_wall_spawn and time.time() - self.board.last_wall_spawn >= Game.WALL_SPAWN_RATE * 1000:
-                self.board.spawn_random_walls(count=1)
+            if self.game["boardHasWalls"] and self.board.get_wall_count() / (self.board.width * self.board.height) < 0.10:
+                if self.board.last_wall_spawn and time.time() - self.board.last_wall_spawn >= Game.WALL_SPAWN_RATE * 1000:
+                    self.board.spawn_random_walls(count=1)
 
         self.turn_number = self.turn_number + 1
         self.update_clients(errors=errors)
 
-        self.history.append(self.board.to_json(api_version=Game.api_version))
+        with metrics.time_phase(PHASE_HISTORY):
+            self.record_history()
+
+        metrics.record_phase(PHASE_TURN, time.time() - turn_started_at)
+        if profiler.active: profiler.count_turn(self.game_id)
 
         # allow the game to continue until there are no snakes alive for testing purposes
         if self.win_conditions_met():
             self.finish_game()
         elif allow_stepping and self.mode == Game.MODE_AUTO and self.game["status"] == Game.STATUS_IN_PROGRESS:
-            time.sleep(self.game["tickRate"] / 1000)
-            self.action_queue.put((1, self.step_game, { "allow_stepping": allow_stepping }))
+            self.schedule_tick(turn_started_at)
 
     def sync_game(self, and_daemon=True):
         app.logger.info("fetching game %s from db", self.game_id)
 
-        self.game = get_game_prepared.first(self.game_id)
+        game = get_game_prepared.first(self.game_id)
         # self.history = self.game["history"]
 
-        if not self.game:
+        if not game:
             raise Exception("game {} not found".format(self.game_id))
 
+        # cached until the game is invalidated, statuses not written yet win over the database
+        self.game = dict(game)
+
+        pending_status = status_writer.get_pending(self.game_id)
+        if pending_status: self.game["status"] = pending_status
+
         if and_daemon and self.game:
             self.game_daemon = {
                 "id": self.game["daemon_id"],
@@ -427,20 +585,94 @@ class Game(Thread):
                 "url": self.game["daemon_url"]
             } if self.game["daemon_id"] else None
 
-    def update_clients(self, errors=None, broadcast=True):
-        data = self.to_json(errors)
-        socketio.emit("update", data, room=self.game_id, broadcast=broadcast)
+    def send_keyframe(self, sid):
+        if self.last_frame is None:
+            self.frame_seq = self.frame_seq + 1
+            self.keyframe_seq = self.frame_seq
+            self.last_frame = self.to_json()
+
+        # the keyframe is the frame the next delta will be computed against
+        socketio.emit("update", {
+            "type": "keyframe",
+            "seq": self.frame_seq,
+            "frame": self.last_frame
+        }, room=sid)
+
+    def update_clients(self, errors=None):
+        with metrics.time_phase(PHASE_SERIALIZE):
+            frame = self.to_json(errors)
+
+        # includes encoding the delta and binary streams
+        with metrics.time_phase(PHASE_EMIT):
+            socketio.emit("update", frame, room=self.get_stream_room(Game.STREAM_JSON))
 
-    def watch(self):
-        join_room(self.game_id)
+            streams = set(self.watchers.values())
+
+            if Game.STREAM_DELTA in streams:
+                self.update_delta_clients(frame)
+            else:
+                self.last_frame = None
+
+            if Game.STREAM_BINARY in streams or Game.STREAM_BINARY_COMPRESSED in streams:
+                self.update_binary_clients(frame, streams)
+
+    def update_binary_clients(self, frame, streams):
+        # nothing to encode until the board is set up
+        if not frame: return
+
+        payload = self.frame_encoder.encode_payload(frame)
+
+        if Game.STREAM_BINARY in streams:
+            socketio.emit(
+                "update",
+                self.frame_encoder.pack_message(payload),
+                room=self.get_stream_room(Game.STREAM_BINARY)
+            )
+
+        if Game.STREAM_BINARY_COMPRESSED in streams:
+            socketio.emit(
+                "update",
+                self.frame_encoder.pack_message(payload, compress=True),
+                room=self.get_stream_room(Game.STREAM_BINARY_COMPRESSED)
+            )
+
+    def update_delta_clients(self, frame):
+        self.frame_seq = self.frame_seq + 1
+
+        if self.last_frame is None or self.frame_seq - self.keyframe_seq >= Game.KEYFRAME_INTERVAL:
+            self.keyframe_seq = self.frame_seq
+            data = { "type": "keyframe", "seq": self.frame_seq, "frame": frame }
+        else:
+            data = diff_frames(self.last_frame, frame)
+            data["type"] = "delta"
+            data["seq"] = self.frame_seq
+
+        self.last_frame = frame
+        socketio.emit("update", data, room=self.get_stream_room(Game.STREAM_DELTA))
+
+    def watch(self, sid, stream=STREAM_JSON):
+        join_room(self.game_id, sid=sid)
 
         if self.game and self.game["status"] == Game.STATUS_COMPLETED:
             self.redirect_to_child()
             return
 
-        redis.incr("game:viewer_count:{}".format(self.game_id))
+        join_room(self.get_stream_room(stream), sid=sid)
+        self.watchers[sid] = stream
+
+        if not self.is_stopped(): viewers.set(self.game_id, len(self.watchers))
 
-        self.update_clients(broadcast=False)
+        if stream == Game.STREAM_DELTA:
+            self.send_keyframe(sid)
+        elif stream in [Game.STREAM_BINARY, Game.STREAM_BINARY_COMPRESSED] and self.board is not None:
+            # new binary spectators need the whole string table before the next broadcast
+            socketio.emit("update", self.frame_encoder.encode(
+                self.to_json(),
+                full_table=True,
+                compress=stream == Game.STREAM_BINARY_COMPRESSED
+            ), room=sid)
+
+        self.update_clients()
 
     def win_conditions_met(self):
         snakes = self.board.get_snakes()
@@ -463,10 +695,10 @@ class Game(Thread):
             data = {
                 "id": self.game["id"],
                 "board": self.board.to_json(api_version=Game.api_version),
-                "daemon": self.game_daemon,
+                "daemon": dict(self.game_daemon) if self.game_daemon else None,
                 "errors": errors,
                 "turnNumber": self.turn_number,
-                "viewers": int(redis.get("game:viewer_count:{}".format(self.game_id)))
+                "viewers": len(self.watchers)
             }
 
         return data
@@ -0,0 +1,138 @@
+import json
+import time
+import zlib
+
+from queue import Empty, Queue
+from threading import Thread
+
+from . import app
+from .queries import delete_game_turns, insert_game_turn
+
+
+class HistoryWriter(Thread):
+    ACTION_APPEND = "APPEND"
+    ACTION_RESET = "RESET"
+
+    def __init__(self, batch_size=100, flush_interval=1, max_pending=10000, max_retries=5, retry_delay=0.5, replays=None):
+        Thread.__init__(self)
+        self.daemon = True
+
+        # optional ReplayWriter that gets the same frames as the database
+        self.replays = replays
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # a batch the database failed on is retried after retry_delay, doubling every time,
+        # and dropped after max_retries
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        # bounded so a slow database pushes back on the games instead of piling up frames
+        self.queue = Queue(maxsize=max_pending)
+
+        self.turns_written = 0
+        self.batches_written = 0
+        self.batches_retried = 0
+        self.turns_dropped = 0
+        self.replay_errors = 0
+
+    def append(self, game_id, turn_number, frame):
+        self.queue.put((HistoryWriter.ACTION_APPEND, game_id, turn_number, frame))
+
+    def get_stats(self):
+        return {
+            "pending": self.queue.qsize(),
+            "turns_written": self.turns_written,
+            "batches_written": self.batches_written,
+            "batches_retried": self.batches_retried,
+            "turns_dropped": self.turns_dropped,
+            "replay_errors": self.replay_errors
+        }
+
+    def reset(self, game_id):
+        self.queue.put((HistoryWriter.ACTION_RESET, game_id, None, None))
+
+    def run(self):
+        while True:
+            pending = [self.queue.get()]
+            flush_at = time.time() + self.flush_interval
+
+            while len(pending) < self.batch_size:
+                timeout = flush_at - time.time()
+                if timeout <= 0: break
+
+                try: pending.append(self.queue.get(True, timeout))
+                except Empty: break
+
+            try: self.flush(pending)
+            except Exception as error:
+                # only frames that can't be serialized get here, database errors are retried in
+                # flush and replay errors never leave it
+                dropped = len([ entry for entry in pending if entry[0] == HistoryWriter.ACTION_APPEND ])
+                self.turns_dropped = self.turns_dropped + dropped
+
+                app.logger.error("dropped %d history turns: %s", dropped, error)
+
+    def flush(self, pending):
+        # the replay files are local, written once and only best effort. only the database
+        # writes are retried.
+        # writes are upserts and deletes, running a batch again ends up in the same place
+        writes = self.prepare(pending)
+
+        for attempt in range(0, self.max_retries + 1):
+            try:
+                self.write(writes)
+                return
+            except Exception as error:
+                app.logger.error("failed to write %d history entries (attempt %d): %s", len(pending), attempt + 1, error)
+
+            if attempt < self.max_retries:
+                self.batches_retried = self.batches_retried + 1
+                time.sleep(self.retry_delay * 2 ** attempt)
+
+        dropped = sum([ len(rows) for game_id, rows in writes if rows ])
+        self.turns_dropped = self.turns_dropped + dropped
+
+        app.logger.error("dropped %d history turns after %d attempts", dropped, self.max_retries + 1)
+
+    def prepare(self, pending):
+        # [(game_id, None)] for a reset, [(None, rows)] for turns
+        writes = []
+        rows = []
+
+        for action, game_id, turn_number, frame in pending:
+            if action == HistoryWriter.ACTION_RESET:
+                if rows: writes.append((None, rows))
+                writes.append((game_id, None))
+                rows = []
+
+                self.write_replay("reset", game_id)
+            else:
+                board = zlib.compress(json.dumps(frame).encode("utf-8"))
+                rows.append((game_id, turn_number, board))
+
+                self.write_replay("append", game_id, turn_number, board)
+
+        if rows: writes.append((None, rows))
+        self.write_replay("flush")
+
+        return writes
+
+    def write_replay(self, method, *args):
+        # the replays are a cache of the history table, failing to write them (a full disk, a
+        # directory we can't write to) mustn't cost the table its turns
+        if not self.replays: return
+
+        try: getattr(self.replays, method)(*args)
+        except Exception as error:
+            self.replay_errors = self.replay_errors + 1
+            app.logger.error("failed to %s replay files: %s", method, error)
+
+    def write(self, writes):
+        for game_id, rows in writes:
+            if rows is None: delete_game_turns(game_id)
+            else: insert_game_turn.load_rows(rows)
+
+        self.turns_written = self.turns_written + sum([ len(rows) for game_id, rows in writes if rows ])
+        self.batches_written = self.batches_written + 1
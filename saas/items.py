@@ -0,0 +1,133 @@
+import random
+
+from typing import Any, Dict, Optional
+
+from .types import Position
+
+Item = Dict[str, Any]
+
+
+class ItemStore(object):
+    # one item ({ "x", "y", ... }) per cell, keyed by position. iterates in the order items
+    # were added, which is the order boards serialize them in
+    def __init__(self, items=None):
+        self.items = { } # (x, y) -> item
+
+        for item in items or []:
+            self.add(item)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def __iter__(self):
+        return iter(self.items.values())
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item: Item):
+        self.items[(item["x"], item["y"])] = item
+
+    def get(self, position: Position) -> Optional[Item]:
+        return self.items.get(position)
+
+    def remove(self, item: Item):
+        position = (item["x"], item["y"])
+        if self.items.get(position) is item: del self.items[position]
+
+
+class FoodStore(ItemStore):
+    # board configurations can place hidden food, spots the static strategy spawns food on.
+    # the spots that aren't showing food are kept in a pool that can be sampled in O(1), a
+    # revealed spot shows a visible copy in its place until that gets eaten
+    def __init__(self, items=None):
+        self.hidden = [] # hidden food that can be revealed
+        self.hidden_index = { } # (x, y) -> index in hidden
+        self.revealed = { } # (x, y) -> hidden food under a visible copy
+
+        ItemStore.__init__(self, items)
+
+    def add(self, food: Item):
+        self.items[(food["x"], food["y"])] = food
+        if "hidden" in food and food["hidden"]: self._add_hidden(food)
+
+    def _add_hidden(self, food: Item):
+        position = (food["x"], food["y"])
+        if position in self.hidden_index: return
+
+        self.hidden_index[position] = len(self.hidden)
+        self.hidden.append(food)
+
+    def get_random_hidden(self) -> Optional[Item]:
+        return random.choice(self.hidden) if self.hidden else None
+
+    def remove(self, food: Item):
+        position = (food["x"], food["y"])
+        if self.items.get(position) is not food: return
+
+        hidden_food = self.revealed.pop(position, None)
+
+        if hidden_food is not None:
+            # assigned rather than re-added, the spot keeps its place
+            self.items[position] = hidden_food
+            self._add_hidden(hidden_food)
+        else:
+            del self.items[position]
+            if food.get("hidden", False): self._remove_hidden(position)
+
+    def _remove_hidden(self, position: Position):
+        # swap with the last one, like Board.free_cells
+        index = self.hidden_index.pop(position, None)
+        if index is None: return
+
+        last_food = self.hidden.pop()
+
+        if (last_food["x"], last_food["y"]) != position:
+            self.hidden[index] = last_food
+            self.hidden_index[(last_food["x"], last_food["y"])] = index
+
+    def reveal(self, hidden_food: Item) -> Item:
+        position = (hidden_food["x"], hidden_food["y"])
+
+        food = hidden_food.copy()
+        food["hidden"] = False
+
+        self.items[position] = food
+        self.revealed[position] = hidden_food
+        self._remove_hidden(position)
+
+        return food
+
+
+class TeleporterStore(ItemStore):
+    # teleporters are also indexed by channel, a snake stepping on one comes out of another
+    # teleporter of the same channel
+    def __init__(self, items=None):
+        self.channels = { } # channel -> [teleporter]
+
+        ItemStore.__init__(self, items)
+
+    def add(self, teleporter: Item):
+        position = (teleporter["x"], teleporter["y"])
+        if position in self.items: self.remove(self.items[position])
+
+        self.items[position] = teleporter
+
+        channel = self.channels.get(teleporter["channel"])
+        if channel is None: self.channels[teleporter["channel"]] = [teleporter]
+        else: channel.append(teleporter)
+
+    def get_destination(self, teleporter: Item) -> Optional[Item]:
+        # a random other teleporter of the channel: one of the first n - 1, where the last
+        # stands in for the teleporter itself
+        channel = self.channels.get(teleporter["channel"], [])
+        if len(channel) < 2: return None
+
+        destination = channel[random.randrange(0, len(channel) - 1)]
+        return channel[-1] if destination is teleporter else destination
+
+    def remove(self, teleporter: Item):
+        if self.items.get((teleporter["x"], teleporter["y"])) is not teleporter: return
+
+        ItemStore.remove(self, teleporter)
+        self.channels[teleporter["channel"]].remove(teleporter)
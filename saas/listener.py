@@ -0,0 +1,39 @@
+import time
+
+from threading import Thread
+
+from . import app
+
+
+class GameListener(Thread):
+    # holds its own connection (outside of the pool) LISTENing for game configuration changes.
+    # the payload of every notification is the id of the game that changed
+    def __init__(self, connect, channel, callback, retry_interval=5):
+        Thread.__init__(self)
+        self.daemon = True
+
+        self.connect = connect
+        self.channel = channel
+        self.callback = callback
+        self.retry_interval = retry_interval
+
+        self.notifications = 0
+
+    def run(self):
+        while True:
+            try:
+                db = self.connect()
+                db.listen(self.channel)
+
+                app.logger.info("listening for game updates on %s", self.channel)
+
+                for channel, payload, pid in db.iternotifies():
+                    self.notifications = self.notifications + 1
+
+                    try: self.callback(payload)
+                    except Exception:
+                        app.logger.exception("failed to handle game update %s", payload)
+            except Exception as error:
+                app.logger.error("game update listener failed: %s", error)
+
+            time.sleep(self.retry_interval)
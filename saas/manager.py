@@ -1,10 +1,11 @@
 from saas.game import Game
-from saas import redis
+from saas import metrics, viewers
 
 class Manager(object):
     def __init__(self, maximum_concurrent_games = 5):
         self.maximum_concurrent_games = maximum_concurrent_games
         self.games = {}
+        self.watchers = {} # sid -> (game_id, stream)
 
     def create_game(self, game_id, board=None, start_on_turn_number=0):
         if game_id in self.games:
@@ -13,13 +14,40 @@ class Manager(object):
         game = Game(game_id, board=board, start_on_turn_number=start_on_turn_number)
         self.games[game_id] = game
 
-        self._reset_game_viewer_count(game_id)
+        # games are recreated once their thread stops, clients watching the old one carry over
+        game.watchers = {
+            sid: stream for sid, (watched_game_id, stream) in self.watchers.items()
+            if watched_game_id == game_id
+        }
+
+        viewers.set(game_id, len(game.watchers))
 
         return game
 
+    def check_stopped(self, game):
+        # stops the game if it has been idle, what it registered goes with it. the game that
+        # replaces it registers again
+        if game.stop_if_idle():
+            viewers.remove(game.game_id)
+            metrics.remove_game(game.game_id)
+
+        return game.is_stopped()
+
+    def disconnect(self, sid):
+        game = self.find_watched_game(sid)
+        self.watchers.pop(sid, None)
+
+        if game: game.disconnect(sid)
+
     def find_game(self, game_id):
         return None if game_id not in self.games else self.games[game_id]
 
+    def find_watched_game(self, sid):
+        if sid not in self.watchers: return None
+
+        game_id, stream = self.watchers[sid]
+        return self.find_game(game_id)
+
     def find_or_create_game(self, game_id):
         created = False
         game = self.find_game(game_id)
@@ -33,61 +61,69 @@ class Manager(object):
     def get_games(self):
         return self.games
 
+    def invalidate_game(self, game_id):
+        game = self.find_game(game_id)
+        if game: game.invalidate()
+
     def pause_game(self, game_id):
         game = self.find_game(game_id)
 
-        if not game or game.stop_game_event.isSet():
+        if not game or self.check_stopped(game):
             if game: del self.games[game_id]
 
             game = self.create_game(game_id)
             game.start()
         else:
-            game.action_queue.put((1, game.pause_game, {}))
+            game.enqueue(game.pause_game)
+            game.start() # no-op unless the game was only created so far
 
     def restart_game(self, game_id):
         game = self.find_game(game_id)
 
-        if not game or game.stop_game_event.isSet():
+        if not game or self.check_stopped(game):
             if game: del self.games[game_id]
 
             game = self.create_game(game_id)
             game.start()
         else:
-            game.action_queue.put((1, game.restart_game, {}))
-
-    def _reset_game_viewer_count(self, game_id):
-        redis.set("game:viewer_count:{}".format(game_id), 0)
+            game.enqueue(game.restart_game)
+            game.start() # no-op unless the game was only created so far
 
     def start_game(self, game_id):
         game = self.find_game(game_id)
 
-        if not game or game.stop_game_event.isSet():
+        if not game or self.check_stopped(game):
             if game: del self.games[game_id]
 
             game = self.create_game(game_id)
             game.start()
         else:
-            game.action_queue.put((1, game.start_game, {}))
+            game.enqueue(game.start_game)
+            game.start() # no-op unless the game was only created so far
 
     def step_game(self, game_id):
         game = self.find_game(game_id)
 
-        if not game or game.stop_game_event.isSet():
+        if not game or self.check_stopped(game):
             previous_board = None
 
             if game:
                 previous_board = game.board
                 del self.games[game_id]
 
-            game = self.create_game(game_id, board=previous_board, start_on_turn_number=game.turn_number)
-            game.start()
+            game = self.create_game(
+                game_id,
+                board=previous_board,
+                start_on_turn_number=game.turn_number if game else 0
+            )
 
-        game.action_queue.put((1, game.step_game, {}))
+        game.enqueue(game.step_game)
+        game.start()
 
     def toggle_game_mode(self, game_id):
         game = self.find_game(game_id)
 
-        if not game or game.stop_game_event.isSet():
+        if not game or self.check_stopped(game):
             if game: del self.games[game_id]
 
             game = self.create_game(game_id)
@@ -95,21 +131,12 @@ class Manager(object):
 
         if game.mode == Game.MODE_AUTO:
             game.mode = Game.MODE_MANUAL
-            # game.action_queue
+            game.cancel_tick()
         else:
             game.mode = Game.MODE_AUTO
-            game.action_queue.put((1, game.step_game, { "allow_stepping": game.mode != Game.MODE_MANUAL }))
-
-    def watch_game(self, game):
-        game.watch()
-
-        current_viewer_count = redis.get("game:viewer_count:{}".format(game.game_id))
-        max_viewer_count = redis.get("game:max_viewer_count:{}".format(game.game_id))
-
-        current_viewer_count = int(current_viewer_count) if current_viewer_count else 0
-        max_viewer_count = int(max_viewer_count) if max_viewer_count else 0
+            game.enqueue(game.step_game, allow_stepping=game.mode != Game.MODE_MANUAL)
+            game.start()
 
-        redis.set(
-            "game:max_viewer_count:{}".format(game.game_id),
-            max(max_viewer_count, current_viewer_count)
-        )
+    def watch_game(self, game, sid, stream=Game.STREAM_JSON):
+        game.watch(sid, stream=stream)
+        self.watchers[sid] = (game.game_id, stream)
@@ -0,0 +1,271 @@
+import math
+import time
+
+from collections import defaultdict, OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+
+from . import app
+
+LATENCY_DAEMON = "daemon"
+LATENCY_SNAKE = "snake"
+
+PHASE_DAEMON = "daemon"
+PHASE_BOUNTY = "bounty"
+PHASE_MOVES = "moves"
+PHASE_BOARD = "board"
+PHASE_SPAWN = "spawn"
+PHASE_SERIALIZE = "serialize"
+PHASE_EMIT = "emit"
+PHASE_HISTORY = "history"
+PHASE_TURN = "turn"
+
+PERCENTILES = [50, 95, 99]
+
+
+class LatencyHistogram(object):
+    # log-linear buckets in the style of HdrHistogram. values are recorded in microseconds,
+    # the first SUB_BUCKETS values get a bucket each and every power of two above that is
+    # split into SUB_BUCKETS linear buckets, so any value lands in a bucket within ~1.5% of it
+    SUB_BUCKET_BITS = 6
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+    def __init__(self):
+        self.buckets = defaultdict(int) # bucket index -> count
+        self.count = 0
+        self.sum = 0
+        self.sumsq = 0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def get_bucket(value):
+        if value < LatencyHistogram.SUB_BUCKETS: return value
+
+        shift = value.bit_length() - LatencyHistogram.SUB_BUCKET_BITS - 1
+        return ((shift + 1) << LatencyHistogram.SUB_BUCKET_BITS) + (value >> shift) - LatencyHistogram.SUB_BUCKETS
+
+    @staticmethod
+    def get_bucket_range(bucket):
+        if bucket < LatencyHistogram.SUB_BUCKETS: return bucket, bucket + 1
+
+        shift = (bucket >> LatencyHistogram.SUB_BUCKET_BITS) - 1
+        low = ((bucket & (LatencyHistogram.SUB_BUCKETS - 1)) + LatencyHistogram.SUB_BUCKETS) << shift
+
+        return low, low + (1 << shift)
+
+    def get_percentile(self, percentile):
+        if not self.count: return None
+
+        rank = max(1, int(math.ceil(self.count * percentile / 100)))
+        seen = 0
+
+        for bucket in sorted(self.buckets):
+            seen = seen + self.buckets[bucket]
+
+            if seen >= rank:
+                low, high = LatencyHistogram.get_bucket_range(bucket)
+                return min((low + high) / 2 / 1000000, self.max)
+
+        return self.max
+
+    def merge(self, other):
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets[bucket] + count
+
+        self.count = self.count + other.count
+        self.sum = self.sum + other.sum
+        self.sumsq = self.sumsq + other.sumsq
+
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def record(self, seconds):
+        seconds = max(seconds, 0)
+
+        self.buckets[LatencyHistogram.get_bucket(int(seconds * 1000000))] += 1
+        self.count = self.count + 1
+        self.sum = self.sum + seconds
+        self.sumsq = self.sumsq + seconds * seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def to_json(self):
+        data = {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max
+        }
+
+        for percentile in PERCENTILES:
+            data["p{}".format(percentile)] = self.get_percentile(percentile)
+
+        return data
+
+
+class Metrics(object):
+    # latencies are recorded into in-process histograms, what was recorded since the last flush
+    # is merged into redis (one hash per daemon/snake url, plus the daemon:response_time sums)
+    # in a single pipeline every `flush_interval` seconds
+    def __init__(self, redis, scheduler, flush_interval=5):
+        self.redis = redis
+        self.scheduler = scheduler
+        self.flush_interval = flush_interval
+
+        self.latencies = { } # (kind, name) -> LatencyHistogram since startup
+        self.latency_games = { } # (kind, name) -> ids of the games recording it
+        self.game_latencies = { } # game_id -> (kind, name) keys the game recorded
+        self.pending_latencies = { } # (kind, name) -> LatencyHistogram since the last flush
+        self.phases = { } # phase -> LatencyHistogram of how long that part of a turn took
+
+        self._lock = Lock()
+
+        self.clients = 0
+        self.flushes = 0
+
+    def flush(self):
+        with self._lock:
+            pending, self.pending_latencies = self.pending_latencies, { }
+
+        try:
+            if pending:
+                pipe = self.redis.pipeline(transaction=False)
+
+                for (kind, name), histogram in pending.items():
+                    key = "latency:{}:{}".format(kind, name)
+
+                    for bucket, count in histogram.buckets.items():
+                        pipe.hincrby(key, bucket, count)
+
+                    pipe.hincrby(key, "count", histogram.count)
+                    pipe.hincrbyfloat(key, "sum", histogram.sum)
+
+                    if kind == LATENCY_DAEMON:
+                        pipe.zincrby("daemon:response_time:{}".format(name), "count", histogram.count)
+                        pipe.zincrby("daemon:response_time:{}".format(name), "sum", histogram.sum)
+                        pipe.zincrby("daemon:response_time:{}".format(name), "sumsq", histogram.sumsq)
+
+                pipe.execute()
+                self.flushes = self.flushes + 1
+        except Exception as error:
+            app.logger.error("failed to flush %d latency histograms: %s", len(pending), error)
+
+            # merged back so nothing is lost, it goes out with the next flush
+            with self._lock:
+                for key, histogram in pending.items():
+                    self._get_histogram(self.pending_latencies, key).merge(histogram)
+        finally:
+            self.start()
+
+    def get_stats(self):
+        stats = { }
+
+        with self._lock:
+            for (kind, name), histogram in self.latencies.items():
+                stats.setdefault(kind, { })[name] = histogram.to_json()
+
+        return stats
+
+    def _get_histogram(self, histograms, key):
+        histogram = histograms.get(key)
+
+        if histogram is None:
+            histogram = LatencyHistogram()
+            histograms[key] = histogram
+
+        return histogram
+
+    def record_phase(self, phase, seconds):
+        with self._lock:
+            self._get_histogram(self.phases, phase).record(seconds)
+
+    def record_latency(self, kind, name, seconds, game_id=None):
+        key = (kind, name)
+
+        with self._lock:
+            self._get_histogram(self.latencies, key).record(seconds)
+            self._get_histogram(self.pending_latencies, key).record(seconds)
+
+            if game_id is not None:
+                self.latency_games.setdefault(key, set()).add(game_id)
+                self.game_latencies.setdefault(game_id, set()).add(key)
+
+    def remove_game(self, game_id):
+        # histograms only the game recorded into are dropped, redis keeps the totals. whatever
+        # is still pending goes out with the next flush
+        with self._lock:
+            for key in self.game_latencies.pop(game_id, set()):
+                games = self.latency_games.get(key)
+                if games is not None: games.discard(game_id)
+
+                if not games:
+                    self.latency_games.pop(key, None)
+                    self.latencies.pop(key, None)
+
+    def start(self):
+        self.scheduler.call_later(self.flush_interval, self.flush)
+
+    @contextmanager
+    def time_phase(self, phase):
+        started_at = time.time()
+
+        try: yield
+        finally: self.record_phase(phase, time.time() - started_at)
+
+    def write_prometheus(self, writer):
+        with self._lock:
+            for phase, histogram in self.phases.items():
+                writer.add_summary("saas_turn_phase_seconds", "time spent in each phase of a turn", histogram, { "phase": phase })
+
+            for (kind, name), histogram in self.latencies.items():
+                writer.add_summary("saas_request_latency_seconds", "daemon and snake response times", histogram, { "kind": kind, "name": name })
+
+        writer.add("saas_clients", "gauge", "connected socket.io clients", self.clients)
+        writer.add("saas_metrics_flushes_total", "counter", "latency flushes to redis", self.flushes)
+
+
+class PrometheusWriter(object):
+    # collects samples into metric families and renders them in the prometheus text format
+    def __init__(self):
+        self.families = OrderedDict() # name -> (type, help, samples)
+
+    def add(self, name, metric_type, help_text, value, labels=None, suffix=""):
+        if value is None: return
+
+        family = self.families.get(name)
+
+        if family is None:
+            family = (metric_type, help_text, [])
+            self.families[name] = family
+
+        family[2].append("{}{}{} {}".format(name, suffix, self._format_labels(labels), float(value)))
+
+    def add_summary(self, name, help_text, histogram, labels=None):
+        for percentile in PERCENTILES:
+            quantile_labels = dict(labels or { })
+            quantile_labels["quantile"] = percentile / 100
+
+            self.add(name, "summary", help_text, histogram.get_percentile(percentile), quantile_labels)
+
+        self.add(name, "summary", help_text, histogram.sum, labels, suffix="_sum")
+        self.add(name, "summary", help_text, histogram.count, labels, suffix="_count")
+
+    def _format_labels(self, labels):
+        if not labels: return ""
+
+        return "{{{}}}".format(",".join([
+            '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n"))
+            for key, value in labels.items()
+        ]))
+
+    def render(self):
+        lines = []
+
+        for name, (metric_type, help_text, samples) in self.families.items():
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
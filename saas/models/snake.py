@@ -1,75 +1,108 @@
 from typing import Dict
-from collections import deque
+from array import array
 
 from saas.board import Board
 import saas.patch
 
+# body segments are packed into a single unsigned 64 bit int, offset so heads that left the
+# board (dead snakes keep moving) still fit
+COORD_OFFSET = 1 << 31
+
+# colour of a segment that came without one (board configurations), it has no "color" key
+NO_COLOR = object()
+
+def pack(x, y):
+  return ((x + COORD_OFFSET) << 32) | (y + COORD_OFFSET)
+
+def unpack(cell):
+  return (cell >> 32) - COORD_OFFSET, (cell & 0xffffffff) - COORD_OFFSET
+
 class Snake(object):
+  # the body is a ring buffer of packed coordinates, head first. every segment is the colour
+  # the snake had when it was placed unless `_colors` (slot -> colour) says otherwise
+  __slots__ = (
+    "_id", "_api_version", "_dev_url", "_is_bounty_snake", "_url",
+    "_cells", "_start", "_length", "_colors", "_body_color", "_body_json",
+    "color", "death", "error", "gold", "health", "kills", "name", "next_move", "score",
+    "secondary_color", "taunt"
+  )
+
+  INITIAL_CAPACITY = 8
+
   def __init__(self, data, starting_health=100):
     self._id = data["id"]
 
     self._api_version = data["api_version"]
-    self._color = data["defaultColor"]
-    self._body = []
-    self._death = None
     self._dev_url = data["devUrl"]
-    self._error = None
-    self._kills = 0
-    self._gold_count = 0
-    self._health = starting_health
     self._is_bounty_snake = data["isBountySnake"]
-    self._name = data["name"]
-    self._next_move = Board.MOVE_UP
-    self._score = 0
-    self._taunt = ""
     self._url = data["url"]
 
+    self.color = data["defaultColor"]
+    self.name = data["name"]
+    self.secondary_color = ""
+
+    self._cells = array("Q", [0]) * Snake.INITIAL_CAPACITY
+    self.reset(starting_health)
+
   @property
   def api_version(self):
     return self._api_version
 
   @property
   def body(self):
-    return self._body
+    # segments in the json shape ({ "x", "y", "color" }), built once per change to the body
+    if self._body_json is None:
+      mask = len(self._cells) - 1
+      self._body_json = [ self._get_segment((self._start + index) & mask) for index in range(0, self._length) ]
+
+    return self._body_json
 
   @body.setter
   def body(self, body):
-    if not isinstance(body, deque):
-      body = deque(body)
+    self._clear_body()
 
-    self._body = body
+    for body_segment in body:
+      self.append(body_segment["x"], body_segment["y"], body_segment.get("color", NO_COLOR))
 
-  @property
-  def color(self):
-    return self._color
+  def append(self, x, y, color):
+    if self._length == len(self._cells): self._grow()
 
-  @color.setter
-  def color(self, color):
-    self._color = color
+    slot = (self._start + self._length) & (len(self._cells) - 1)
+    self._cells[slot] = pack(x, y)
+    self._set_color(slot, color)
 
-  @property
-  def death(self):
-    return self._death
+    self._length = self._length + 1
+    self._body_json = None
 
-  @death.setter
-  def death(self, death):
-    self._death = death
+  def _clear_body(self):
+    # the buffer is kept, it only ever grows
+    self._start = 0
+    self._length = 0
+    self._colors = { }
+    self._body_json = None
 
-  @property
-  def error(self):
-    return self._error
+  def get_positions(self):
+    # (x, y) of every segment, head first
+    mask = len(self._cells) - 1
 
-  @error.setter
-  def error(self, error):
-    self._error = error
+    for index in range(0, self._length):
+      yield unpack(self._cells[(self._start + index) & mask])
 
-  @property
-  def gold(self):
-    return self._gold_count
+  def _get_segment(self, slot):
+    x, y = unpack(self._cells[slot])
+    color = self._colors.get(slot, self._body_color)
+
+    if color is NO_COLOR: return { "x": x, "y": y }
+
+    return { "x": x, "y": y, "color": color }
 
-  @gold.setter
-  def gold(self, gold_count):
-    self._gold_count = gold_count
+  def _grow(self):
+    capacity = len(self._cells)
+    slots = [ (self._start + index) & (capacity - 1) for index in range(0, self._length) ]
+
+    self._cells = array("Q", [ self._cells[slot] for slot in slots ]) + array("Q", [0]) * (capacity * 2 - len(slots))
+    self._colors = { index: self._colors[slot] for index, slot in enumerate(slots) if slot in self._colors }
+    self._start = 0
 
   def handle_move_response(self, move_response):
     self.error = None # clear error
@@ -89,15 +122,17 @@ class Snake(object):
 
   @property
   def head(self):
-    return self.body[0]
+    return self._get_segment(self._start)
 
   @property
-  def health(self):
-    return self._health
+  def head_color(self):
+    # what a new head gets, segments without a colour fall back to the snake's
+    color = self._colors.get(self._start, self._body_color)
+    return self.color if color is NO_COLOR else color
 
-  @health.setter
-  def health(self, health):
-    self._health = health
+  @property
+  def head_position(self):
+    return unpack(self._cells[self._start])
 
   @property
   def id(self):
@@ -121,35 +156,43 @@ class Snake(object):
     self.death = { "turn": turn_number, "reason": reason, "killer": killer }
 
   @property
-  def kills(self):
-    return self._kills
+  def length(self):
+    return self._length
 
-  @kills.setter
-  def kills(self, kills):
-    self._kills = kills
+  def pop_head(self):
+    slot = self._start
+    self._colors.pop(slot, None)
 
-  @property
-  def length(self):
-    return len(self._body)
+    self._start = (slot + 1) & (len(self._cells) - 1)
+    self._length = self._length - 1
+    self._body_json = None
 
-  @property
-  def name(self):
-    return self._name
+    return unpack(self._cells[slot])
 
-  @name.setter
-  def name(self, new_name):
-    self._name = new_name
+  def pop_tail(self):
+    slot = (self._start + self._length - 1) & (len(self._cells) - 1)
+    self._colors.pop(slot, None)
 
-  @property
-  def next_move(self):
-    return self._next_move
+    self._length = self._length - 1
+    self._body_json = None
 
-  @next_move.setter
-  def next_move(self, next_move):
-    self._next_move = next_move
+    return unpack(self._cells[slot])
+
+  def push_head(self, x, y, color):
+    if self._length == len(self._cells): self._grow()
+
+    slot = (self._start - 1) & (len(self._cells) - 1)
+    self._cells[slot] = pack(x, y)
+    self._set_color(slot, color)
+
+    self._start = slot
+    self._length = self._length + 1
+    self._body_json = None
 
   def reset(self, starting_health=100):
-    self.body = []
+    self._clear_body()
+    self._body_color = self.color
+
     self.death = None
     self.error = None
     self.kills = 0
@@ -159,21 +202,13 @@ class Snake(object):
     self.score = 0
     self.taunt = ""
 
-  @property
-  def secondary_color(self):
-    return self._secondary_color
-
-  @secondary_color.setter
-  def secondary_color(self, secondary_color):
-    self._secondary_color = secondary_color
+  def _set_color(self, slot, color):
+    if color is not NO_COLOR and color == self._body_color: self._colors.pop(slot, None)
+    else: self._colors[slot] = color
 
   @property
-  def taunt(self):
-    return self._taunt
-
-  @taunt.setter
-  def taunt(self, taunt):
-    self._taunt = taunt
+  def tail(self):
+    return self._get_segment((self._start + self._length - 1) & (len(self._cells) - 1))
 
   def tick(self):
     pass
@@ -184,4 +219,4 @@ class Snake(object):
   url = property(get_url)
 
   def to_json(self, api_version):
-    return patch.get_snake(self, self.api_version)
+    return saas.patch.get_snake(self, api_version)
@@ -0,0 +1,83 @@
+import os
+import signal
+
+from collections import Counter
+from threading import Event, Lock
+
+
+class Profiler(object):
+    # a statistical profiler driven by SIGPROF, every `interval` seconds of cpu time the stack
+    # that is running gets counted. nothing is installed while it isn't running. samples come
+    # out as collapsed stacks ("outer;inner;innermost count"), which flamegraph.pl and
+    # speedscope both read
+    def __init__(self, interval=0.005):
+        self.interval = interval
+
+        self.active = False
+        self.game_id = None
+        self.turns_left = None
+        self.samples = Counter()
+        self.skipped = 0
+        self.done = Event()
+
+        self._lock = Lock()
+
+    def count_turn(self, game_id):
+        if self.turns_left is None: return
+        if self.game_id is not None and game_id != self.game_id: return
+
+        self.turns_left = self.turns_left - 1
+        if self.turns_left <= 0: self.done.set()
+
+    def format_collapsed(self, samples):
+        return "".join([ "{} {}\n".format(stack, count) for stack, count in samples.most_common() ])
+
+    def start(self, game_id=None, turns=None):
+        with self._lock:
+            if self.active: return False
+
+            self.active = True
+            self.game_id = game_id
+            self.turns_left = turns
+            self.samples = Counter()
+            self.skipped = 0
+            self.done.clear()
+
+        signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+        return True
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        # the default action for SIGPROF is to terminate, one might still be pending
+        signal.signal(signal.SIGPROF, signal.SIG_IGN)
+
+        with self._lock:
+            samples = self.samples
+            self.active = False
+            self.game_id = None
+            self.turns_left = None
+
+        return samples
+
+    def _sample(self, signum, frame):
+        stack = []
+        matched = self.game_id is None
+
+        while frame is not None:
+            code = frame.f_code
+
+            # only stacks running on behalf of the game being profiled count
+            if not matched and getattr(frame.f_locals.get("self"), "game_id", None) == self.game_id:
+                matched = True
+
+            stack.append("{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+
+        if not matched:
+            self.skipped = self.skipped + 1
+            return
+
+        stack.reverse()
+        self.samples[";".join(stack)] += 1
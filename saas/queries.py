@@ -2,6 +2,15 @@ import uuid
 
 from saas import postgres
 
+insert_game_turn = postgres.prepare("""
+    INSERT INTO "public"."GameTurns" ("GameId", "turn", "board") VALUES ($1::text::uuid, $2, $3)
+    ON CONFLICT ("GameId", "turn") DO UPDATE SET "board" = EXCLUDED."board", "createdAt" = NOW()
+""")
+
+delete_game_turns = postgres.prepare("""
+    DELETE FROM "public"."GameTurns" WHERE "GameId" = $1::text::uuid
+""")
+
 set_game_history = postgres.prepare("""
     UPDATE "public"."Games" AS "g" SET "history" = $1 WHERE "g"."id" = $2
 """)
@@ -10,8 +19,10 @@ set_game_status = postgres.prepare("""
     UPDATE "public"."Games" AS "g" SET "status" = $1 WHERE "g"."id" = $2
 """)
 
-set_snake_place = postgres.prepare("""
-    UPDATE "public"."SnakeGames" SET "place" = $1 WHERE "SnakeId" = $2 AND "GameId" = $3
+set_snake_places = postgres.prepare("""
+    UPDATE "public"."SnakeGames" AS "sg" SET "place" = "p"."place"
+    FROM unnest($1::text[], $2::int[]) AS "p" ("SnakeId", "place")
+    WHERE "sg"."SnakeId" = "p"."SnakeId"::uuid AND "sg"."GameId" = $3
 """)
 
 get_game_prepared = postgres.prepare("""
@@ -0,0 +1,138 @@
+import json
+import mmap
+import os
+import re
+import struct
+import zlib
+
+from collections import OrderedDict
+
+# every game gets two files in the replay directory:
+#
+# {game_id}.frames  append-only log of zlib compressed board frames
+# {game_id}.index   one INDEX_ENTRY slot per turn number (offset + 1 into the frames file, frame
+#                   length), 0 for turns that were never written. seeking to a turn is one slot read
+
+INDEX_ENTRY = struct.Struct("<QI")
+
+GAME_ID_PATTERN = re.compile(r"^[0-9a-zA-Z-]+$")
+
+
+def get_replay_paths(directory, game_id):
+    if not GAME_ID_PATTERN.match(game_id):
+        raise ValueError("invalid game id {}".format(game_id))
+
+    return (
+        os.path.join(directory, "{}.frames".format(game_id)),
+        os.path.join(directory, "{}.index".format(game_id))
+    )
+
+
+class ReplayWriter(object):
+    def __init__(self, directory, max_open_games=256):
+        self.directory = directory
+        self.max_open_games = max_open_games
+
+        self._files = OrderedDict() # game_id -> (frames, index)
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def append(self, game_id, turn_number, compressed_frame):
+        frames, index = self._open(game_id)
+
+        frames.seek(0, os.SEEK_END)
+        offset = frames.tell()
+        frames.write(compressed_frame)
+
+        index.seek(turn_number * INDEX_ENTRY.size)
+        index.write(INDEX_ENTRY.pack(offset + 1, len(compressed_frame)))
+
+    def flush(self):
+        for game_id, (frames, index) in self._files.items():
+            # frames first, an index entry must never point past the end of the log
+            frames.flush()
+            index.flush()
+
+    def reset(self, game_id):
+        self.close(game_id)
+
+        for path in get_replay_paths(self.directory, game_id):
+            if os.path.exists(path): os.remove(path)
+
+    def close(self, game_id):
+        files = self._files.pop(game_id, None)
+        if not files: return
+
+        for replay_file in files:
+            replay_file.close()
+
+    def _open(self, game_id):
+        if game_id in self._files:
+            self._files.move_to_end(game_id)
+            return self._files[game_id]
+
+        while len(self._files) >= self.max_open_games:
+            self.close(next(iter(self._files)))
+
+        frames_path, index_path = get_replay_paths(self.directory, game_id)
+        files = (open(frames_path, "ab"), open(index_path, "r+b" if os.path.exists(index_path) else "w+b"))
+
+        self._files[game_id] = files
+        return files
+
+
+class ReplayReader(object):
+    def __init__(self, directory, game_id):
+        self.directory = directory
+        self.game_id = game_id
+
+        self._frames = None
+        self._index = None
+
+        self.refresh()
+
+    def refresh(self):
+        # the writer keeps appending while a game is running, remap to see the new turns
+        self.close()
+
+        frames_path, index_path = get_replay_paths(self.directory, self.game_id)
+
+        if not os.path.exists(index_path) or not os.path.getsize(index_path):
+            raise FileNotFoundError("no replay for {}".format(self.game_id))
+
+        with open(frames_path, "rb") as frames, open(index_path, "rb") as index:
+            self._frames = mmap.mmap(frames.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(frames_path) else b""
+            self._index = mmap.mmap(index.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        for mapped in [self._frames, self._index]:
+            if isinstance(mapped, mmap.mmap): mapped.close()
+
+        self._frames = None
+        self._index = None
+
+    def get_turn_count(self):
+        return len(self._index) // INDEX_ENTRY.size
+
+    def get_turn(self, turn_number):
+        if turn_number < 0: return None
+        if turn_number >= self.get_turn_count(): self.refresh()
+        if turn_number >= self.get_turn_count(): return None
+
+        offset, length = INDEX_ENTRY.unpack_from(self._index, turn_number * INDEX_ENTRY.size)
+
+        if not offset: return None
+        if offset - 1 + length > len(self._frames): self.refresh()
+
+        return json.loads(zlib.decompress(self._frames[offset - 1:offset - 1 + length]).decode("utf-8"))
+
+    def iter_turns(self, start, end=None):
+        turn_number = start
+
+        while end is None or turn_number <= end:
+            frame = self.get_turn(turn_number)
+
+            if frame is None and turn_number >= self.get_turn_count(): return
+            if frame is not None: yield turn_number, frame
+
+            turn_number = turn_number + 1
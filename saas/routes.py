@@ -1,7 +1,16 @@
+import hmac
 import json
-from saas import socketio, app, manager
-from flask_socketio import emit, rooms
-from flask import render_template, request, jsonify
+import math
+from saas import socketio, app, history_writer, http_client, manager, metrics, postgres, profiler, scheduler, settings
+from saas.game import Game
+from saas.metrics import PrometheusWriter
+from saas.replay import ReplayReader
+from flask_socketio import emit
+from flask import abort, render_template, request, jsonify, Response
+from threading import Event
+
+# sid -> Event that stops the replay streaming to that client, one replay per client
+replays = { }
 
 @app.route("/")
 def index():
@@ -12,15 +21,116 @@ def start(game_id):
     manager.start_game(game_id)
     return json.dumps([id for id, game in manager.get_games().items()])
 
+@app.route("/admin/profile")
+def profile():
+    # ?seconds=10 profiles the whole process, add &game=<id> for a single game and &turns=N to
+    # stop after that many turns (seconds is still the upper bound)
+    if not settings.ADMIN_TOKEN: abort(404)
+
+    # header only, query strings end up in access logs
+    token = request.headers.get("X-Admin-Token", "")
+    if not hmac.compare_digest(token, settings.ADMIN_TOKEN): abort(403)
+
+    game_id = request.args.get("game")
+    turns = request.args.get("turns", type=int)
+    seconds = min(request.args.get("seconds", 10, type=float), settings.PROFILER_MAX_SECONDS)
+
+    if game_id and not manager.find_game(game_id): abort(404)
+    if not profiler.start(game_id=game_id, turns=turns): abort(409)
+
+    try: profiler.done.wait(seconds)
+    finally: samples = profiler.stop()
+
+    app.logger.info("profiled %s, %d samples", game_id or "process", sum(samples.values()))
+
+    return Response(profiler.format_collapsed(samples), mimetype="text/plain")
+
 @app.route("/board/<string:game_id>")
 def board(game_id):
     game, created = manager.find_or_create_game(game_id)
     return jsonify(game.to_json())
 
+@app.route("/board/<string:game_id>/<int:turn_number>")
+def board_at_turn(game_id, turn_number):
+    try: reader = ReplayReader(settings.REPLAY_DIR, game_id)
+    except (FileNotFoundError, ValueError): abort(404)
+
+    try: frame = reader.get_turn(turn_number)
+    finally: reader.close()
+
+    if frame is None: abort(404)
+
+    return jsonify({ "id": game_id, "board": frame, "turnNumber": turn_number })
+
+@app.route("/metrics")
+def prometheus_metrics():
+    writer = PrometheusWriter()
+    metrics.write_prometheus(writer)
+
+    games = manager.get_games()
+    # read only, games that went idle count as stopped but are left for the manager to stop
+    running_games = {
+        game_id: game for game_id, game in games.items()
+        if not game.stop_game_event.is_set() and not game.is_idle()
+    }
+    writer.add("saas_games", "gauge", "games that haven't stopped", len(running_games))
+
+    # only running games get labelled series, stopped ones stay in the manager and their series
+    # would pile up for as long as the process runs
+    for game_id, game in running_games.items():
+        labels = { "game": game_id }
+
+        writer.add("saas_game_queued_actions", "gauge", "actions waiting to be processed", game.action_queue.qsize(), labels)
+        writer.add("saas_game_viewers", "gauge", "spectators watching the game", len(game.watchers), labels)
+        writer.add("saas_game_turn", "gauge", "current turn number", game.turn_number, labels)
+        writer.add("saas_game_tick_lag_seconds", "gauge", "how late the last auto mode tick started", game.tick_lag, labels)
+        writer.add("saas_game_tick_overruns_total", "counter", "turns that ran past the next tick", game.tick_overruns, labels)
+
+    writer.add("saas_viewers", "gauge", "spectators across all games", sum([ len(game.watchers) for game_id, game in games.items() ]))
+
+    scheduler_stats = scheduler.get_stats()
+    writer.add("saas_scheduler_timers", "gauge", "pending scheduler timers", scheduler_stats["timers"])
+    writer.add("saas_scheduler_ready", "gauge", "callbacks waiting for a worker", scheduler_stats["ready"])
+    writer.add("saas_scheduler_callbacks_total", "counter", "callbacks run by the scheduler", scheduler_stats["callbacks_run"])
+
+    db_stats = postgres.get_stats()
+    writer.add("saas_db_connections", "gauge", "open database connections", db_stats["open"])
+    writer.add("saas_db_connections_in_use", "gauge", "database connections checked out", db_stats["in_use"])
+    writer.add("saas_db_checkouts_total", "counter", "database connection checkouts", db_stats["checkouts"])
+    writer.add("saas_db_waits_total", "counter", "checkouts that waited for a connection", db_stats["waits"])
+    writer.add("saas_db_wait_seconds_total", "counter", "time spent waiting for a connection", db_stats["wait_time"])
+
+    history_stats = history_writer.get_stats()
+    writer.add("saas_history_pending", "gauge", "history entries waiting to be written", history_stats["pending"])
+    writer.add("saas_history_turns_written_total", "counter", "turns written to the history table", history_stats["turns_written"])
+    writer.add("saas_history_batches_retried_total", "counter", "history batches retried after a database error", history_stats["batches_retried"])
+    writer.add("saas_history_turns_dropped_total", "counter", "turns dropped after running out of retries", history_stats["turns_dropped"])
+    writer.add("saas_history_replay_errors_total", "counter", "failed replay file writes", history_stats["replay_errors"])
+
+    http_stats = http_client.get_stats()
+    for origin, stats in http_stats["origins"].items():
+        labels = { "origin": origin }
+
+        writer.add("saas_http_connections_total", "counter", "connections opened per origin", stats["connections"], labels)
+        writer.add("saas_http_requests_total", "counter", "requests made per origin", stats["requests"], labels)
+
+    return Response(writer.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/stats/db")
+def db_stats():
+    return jsonify(postgres.get_stats())
+
+@app.route("/stats/http")
+def http_stats():
+    return jsonify(http_client.get_stats())
+
+@app.route("/stats/latency")
+def latency_stats():
+    return jsonify(metrics.get_stats())
+
 @app.route("/step/<string:game_id>")
 def step(game_id):
-    game, created = manager.find_or_create_game(game_id)
-    game.step_game(allow_stepping=False)
+    manager.step_game(game_id)
     # print(game.board.to_json())
 
     return ""
@@ -28,33 +138,104 @@ def step(game_id):
 @socketio.on("connect")
 def on_connect():
     app.logger.info("client %s connected", request.sid)
+    metrics.clients = metrics.clients + 1
 
 @socketio.on("disconnect")
 def on_disconnect():
-    client_rooms = [ room for room in rooms() if room != request.sid ]
-    app.logger.info("client %s disconnected, leaving %s", request.sid, ",".join(client_rooms))
+    game = manager.find_watched_game(request.sid)
+    app.logger.info("client %s disconnected, leaving %s", request.sid, game.game_id if game else None)
 
-    if client_rooms:
-        game_id = client_rooms[0]
-        game = manager.find_game(game_id)
-        game.disconnect()
+    manager.disconnect(request.sid)
+    stop_replay(request.sid)
+    metrics.clients = metrics.clients - 1
 
 @socketio.on("watch")
-def watch_game(game_id):
-    app.logger.info("client %s joined %s",request.sid, game_id)
+def watch_game(options):
+    # either the game id or { "gameId": ..., "format": "json" | "delta" | "binary", "compress": bool }
+    if isinstance(options, dict):
+        game_id = options.get("gameId")
+        stream = options.get("format", Game.STREAM_JSON)
+
+        if stream == Game.STREAM_BINARY and options.get("compress"):
+            stream = Game.STREAM_BINARY_COMPRESSED
+    else:
+        game_id = options
+        stream = Game.STREAM_JSON
+
+    if stream not in Game.STREAMS:
+        emit("error", "unknown format: {}".format(stream), broadcast=False)
+        return
+
+    app.logger.info("client %s joined %s (%s)", request.sid, game_id, stream)
     game, created = manager.find_or_create_game(game_id)
-    manager.watch_game(game)
+    manager.watch_game(game, request.sid, stream=stream)
 
     emit("message", "watching {}".format(game.game_id), broadcast=False)
     if created: game.start()
 
+@socketio.on("keyframe")
+def send_keyframe():
+    game = manager.find_watched_game(request.sid)
+
+    if game: game.send_keyframe(request.sid)
+    else: emit("error", "not watching a game", broadcast=False)
+
+@socketio.on("replay")
+def replay_game(options):
+    # { "gameId": ..., "from": 0, "to": null, "speed": turns per second }
+    try:
+        game_id = str(options["gameId"])
+        start = max(int(options.get("from") or 0), 0)
+        end = int(options["to"]) if options.get("to") is not None else None
+        speed = float(options["speed"]) if options.get("speed") is not None else 10
+    except (KeyError, TypeError, ValueError, AttributeError):
+        emit("error", "invalid replay options: {}".format(options), broadcast=False)
+        return
+
+    if not math.isfinite(speed):
+        emit("error", "invalid replay speed: {}".format(speed), broadcast=False)
+        return
+
+    speed = min(max(speed, settings.REPLAY_MIN_SPEED), settings.REPLAY_MAX_SPEED)
+
+    try: reader = ReplayReader(settings.REPLAY_DIR, game_id)
+    except (FileNotFoundError, ValueError):
+        emit("error", "no replay for {}".format(game_id), broadcast=False)
+        return
+
+    # a new replay replaces the one the client was already watching
+    stop_replay(request.sid)
+    stop = replays[request.sid] = Event()
+
+    socketio.start_background_task(stream_replay, request.sid, reader, start, end, speed, stop)
+
+def stop_replay(sid):
+    stop = replays.pop(sid, None)
+    if stop: stop.set()
+
+def stream_replay(sid, reader, start, end, speed, stop):
+    try:
+        for turn_number, frame in reader.iter_turns(start, end):
+            if stop.is_set(): return
+
+            socketio.emit("replay", { "id": reader.game_id, "board": frame, "turnNumber": turn_number }, room=sid)
+            if stop.wait(1 / speed): return
+    except (FileNotFoundError, ValueError) as e:
+        # the replay was removed while streaming
+        socketio.emit("error", "replay of {} stopped: {}".format(reader.game_id, e), room=sid)
+    finally:
+        reader.close()
+        if replays.get(sid) is stop: del replays[sid]
+
+    socketio.emit("replay_end", { "id": reader.game_id }, room=sid)
+
 @socketio.on("keyboard_event")
 def handle_keyboard_event(event):
     app.logger.info("keyboard event: %s", event)
-    client_rooms = [ room for room in rooms() if room != request.sid ]
+    game = manager.find_watched_game(request.sid)
 
-    if client_rooms:
-        game_id = client_rooms[0]
+    if game:
+        game_id = game.game_id
         app.logger.info("keyboard event -> %s", game_id)
         key = event["key"]
 
@@ -0,0 +1,99 @@
+import heapq
+import itertools
+import time
+
+from queue import Queue
+from threading import Condition, Thread
+
+from . import app
+
+
+class Timer(object):
+    def __init__(self, deadline, callback, args, kwargs):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler(Thread):
+    # one thread keeps a heap of timers and sleeps until the earliest is due, due callbacks
+    # (and anything passed to call_soon) run on a small pool of workers. nothing wakes up
+    # unless there is something to run
+    def __init__(self, workers=32):
+        Thread.__init__(self)
+        self.daemon = True
+
+        self.worker_count = workers
+
+        self._timers = []
+        self._counter = itertools.count()
+        self._condition = Condition()
+        self._ready = Queue()
+        self._workers = []
+
+        self.callbacks_run = 0
+
+    def call_at(self, deadline, callback, *args, **kwargs):
+        timer = Timer(deadline, callback, args, kwargs)
+
+        with self._condition:
+            heapq.heappush(self._timers, (deadline, next(self._counter), timer))
+
+            # only the earliest timer changes how long the loop should sleep
+            if self._timers[0][2] is timer: self._condition.notify()
+
+        return timer
+
+    def call_later(self, delay, callback, *args, **kwargs):
+        return self.call_at(time.time() + delay, callback, *args, **kwargs)
+
+    def call_soon(self, callback, *args, **kwargs):
+        self._ready.put((callback, args, kwargs))
+
+    def get_stats(self):
+        return {
+            "timers": len(self._timers),
+            "ready": self._ready.qsize(),
+            "workers": self.worker_count,
+            "callbacks_run": self.callbacks_run
+        }
+
+    def run(self):
+        for _ in range(0, self.worker_count):
+            worker = Thread(target=self._work)
+            worker.daemon = True
+            worker.start()
+
+            self._workers.append(worker)
+
+        while True:
+            with self._condition:
+                while not self._timers:
+                    self._condition.wait()
+
+                deadline, _, timer = self._timers[0]
+                timeout = deadline - time.time()
+
+                if timeout > 0:
+                    self._condition.wait(timeout)
+                    continue
+
+                heapq.heappop(self._timers)
+
+            if not timer.cancelled:
+                self._ready.put((timer.callback, timer.args, timer.kwargs))
+
+    def _work(self):
+        while True:
+            callback, args, kwargs = self._ready.get()
+
+            try: callback(*args, **kwargs)
+            except Exception:
+                app.logger.exception("scheduled callback %s failed", getattr(callback, "__name__", callback))
+
+            self.callbacks_run = self.callbacks_run + 1
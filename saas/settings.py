@@ -7,11 +7,42 @@ load_dotenv(dotenv_path)
 
 PORT = int(environ.get("PORT", 3001))
 
+# set by simulate.py, the package is only used for its engine
+HEADLESS = bool(environ.get("HEADLESS"))
+
+# admin routes are disabled unless this is set
+ADMIN_TOKEN = environ.get("ADMIN_TOKEN")
+
 DB_HOST = environ.get("DB_HOST")
 DB_USER = environ.get("DB_USER")
 DB_PASSWORD = environ.get("DB_PASSWORD")
 DB_NAME = environ.get("DB_NAME")
+DB_POOL_SIZE = int(environ.get("DB_POOL_SIZE", 10))
+DB_GAME_UPDATES_CHANNEL = environ.get("DB_GAME_UPDATES_CHANNEL", "game_updated")
 
 REDIS_HOST = environ.get("REDIS_HOST")
 REDIS_PASSWORD = environ.get("REDIS_PASSWORD")
 REDIS_DATABASE = environ.get("REDIS_DATABASE")
+REDIS_VIEWER_SYNC_INTERVAL = float(environ.get("REDIS_VIEWER_SYNC_INTERVAL", 1))
+REDIS_METRICS_FLUSH_INTERVAL = float(environ.get("REDIS_METRICS_FLUSH_INTERVAL", 5))
+
+HTTP_POOL_CONNECTIONS = int(environ.get("HTTP_POOL_CONNECTIONS", 100))
+HTTP_POOL_MAXSIZE = int(environ.get("HTTP_POOL_MAXSIZE", 10))
+HTTP_DNS_TTL = int(environ.get("HTTP_DNS_TTL", 60))
+
+STATUS_FLUSH_INTERVAL = float(environ.get("STATUS_FLUSH_INTERVAL", 0.5))
+
+HISTORY_BATCH_SIZE = int(environ.get("HISTORY_BATCH_SIZE", 100))
+HISTORY_FLUSH_INTERVAL = float(environ.get("HISTORY_FLUSH_INTERVAL", 1))
+HISTORY_MAX_PENDING = int(environ.get("HISTORY_MAX_PENDING", 10000))
+HISTORY_MAX_RETRIES = int(environ.get("HISTORY_MAX_RETRIES", 5))
+HISTORY_RETRY_DELAY = float(environ.get("HISTORY_RETRY_DELAY", 0.5))
+
+REPLAY_DIR = environ.get("REPLAY_DIR", join(dirname(__file__), "..", "replays"))
+REPLAY_MIN_SPEED = float(environ.get("REPLAY_MIN_SPEED", 0.5))
+REPLAY_MAX_SPEED = float(environ.get("REPLAY_MAX_SPEED", 60))
+
+SCHEDULER_WORKERS = int(environ.get("SCHEDULER_WORKERS", 32))
+
+PROFILER_INTERVAL = float(environ.get("PROFILER_INTERVAL", 0.005))
+PROFILER_MAX_SECONDS = float(environ.get("PROFILER_MAX_SECONDS", 60))
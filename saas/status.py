@@ -0,0 +1,75 @@
+import time
+
+from threading import Condition, Lock, Thread
+
+from . import app, postgres
+from .queries import set_game_status
+
+
+class StatusWriter(Thread):
+    # game status changes are written behind the games. changes that come in while a write is
+    # pending are coalesced, only the latest status of each game is written
+    def __init__(self, flush_interval=0.5):
+        Thread.__init__(self)
+        self.daemon = True
+
+        self.flush_interval = flush_interval
+
+        self._pending = { } # game_id -> status
+        self._condition = Condition()
+        self._flush_lock = Lock()
+
+        self.statuses_written = 0
+        self.statuses_coalesced = 0
+
+    def discard(self, game_id):
+        # waits for a write in flight, nothing queued before this can land after it
+        with self._flush_lock, self._condition:
+            self._pending.pop(game_id, None)
+
+    def get_pending(self, game_id):
+        return self._pending.get(game_id)
+
+    def get_stats(self):
+        return {
+            "pending": len(self._pending),
+            "statuses_written": self.statuses_written,
+            "statuses_coalesced": self.statuses_coalesced
+        }
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+
+            # give the game a moment to change its mind
+            time.sleep(self.flush_interval)
+
+            with self._flush_lock:
+                with self._condition:
+                    pending, self._pending = self._pending, { }
+
+                try: self.flush(pending)
+                except Exception as error:
+                    app.logger.error("failed to write %d game statuses: %s", len(pending), error)
+
+                    # retry with the next batch unless the status changed again in the meantime
+                    with self._condition:
+                        for game_id, status in pending.items():
+                            self._pending.setdefault(game_id, status)
+
+    def flush(self, pending):
+        if not pending: return
+
+        with postgres.xact():
+            set_game_status.load_rows([ (status, game_id) for game_id, status in pending.items() ])
+
+        self.statuses_written = self.statuses_written + len(pending)
+
+    def set_status(self, game_id, status):
+        with self._condition:
+            if game_id in self._pending: self.statuses_coalesced = self.statuses_coalesced + 1
+
+            self._pending[game_id] = status
+            self._condition.notify()
@@ -0,0 +1,570 @@
+import random
+
+import numpy as np
+
+from .board import Board
+from .constants import SPAWN_STRATEGY_RANDOM
+from .engine import BOTS, DEFAULT_RULES, Engine
+
+# many games stepped at once, every piece of state is an array with the game as its first axis
+# (struct of arrays). snakes are still handled one after the other inside a turn, in the same
+# order as Board.update, but each of those steps is a handful of array ops across all games
+#
+# only the rules Board.update applies to snakes, food, gold and walls are supported, there are
+# no teleporters and food only respawns randomly
+
+MOVES = [Board.MOVE_UP, Board.MOVE_DOWN, Board.MOVE_LEFT, Board.MOVE_RIGHT]
+MOVE_INDEX = { move: index for index, move in enumerate(MOVES) }
+
+MOVE_DX = np.array([0, 0, -1, 1], dtype=np.int16)
+MOVE_DY = np.array([-1, 1, 0, 0], dtype=np.int16)
+
+DEATH_NONE = 0
+DEATH_OOB = 1
+DEATH_WALL = 2
+DEATH_KILLED = 3
+DEATH_COLLISION = 4
+DEATH_REASONS = [None, "oob", "wall", "killed", "collision"]
+
+NO_SNAKE = -1
+
+# everything with the game as its first axis
+GAME_FIELDS = [
+    "body_x", "body_y", "head", "length", "occupancy", "food", "gold", "walls", "health", "score", "kills",
+    "gold_count", "next_move", "alive", "death_turn", "death_reason", "killer", "running", "turns"
+]
+
+
+class VectorEngine(object):
+    def __init__(self, games, snakes=4, width=11, height=11, rules=None, max_turns=500, max_length=None, seed=None):
+        self.rules = dict(DEFAULT_RULES)
+        self.rules.update(rules or { })
+
+        if self.rules["boardHasTeleporters"]:
+            raise ValueError("teleporters aren't supported")
+
+        if self.rules["boardFoodStrategy"] != SPAWN_STRATEGY_RANDOM:
+            raise ValueError("only random food spawning is supported")
+
+        self.games = games
+        self.snakes = snakes
+        self.width = width
+        self.height = height
+        self.max_turns = max_turns
+        self.random = np.random.RandomState(seed)
+
+        # a body grows by at most one segment a turn
+        self.capacity = (max_length or 3) + max_turns + 1
+
+        # body ring buffers, segment k of a snake is at (head + k) % capacity
+        self.body_x = np.zeros((games, snakes, self.capacity), dtype=np.int16)
+        self.body_y = np.zeros((games, snakes, self.capacity), dtype=np.int16)
+        self.head = np.zeros((games, snakes), dtype=np.int32)
+        self.length = np.zeros((games, snakes), dtype=np.int32)
+
+        # segments of each snake on each cell (bodies can overlap themselves), out of bounds
+        # segments are only in the ring buffers
+        self.occupancy = np.zeros((games, snakes, height, width), dtype=np.uint16)
+        self.food = np.zeros((games, height, width), dtype=bool)
+        self.gold = np.zeros((games, height, width), dtype=bool)
+        self.walls = np.zeros((games, height, width), dtype=bool)
+
+        self.health = np.full((games, snakes), 100, dtype=np.int16)
+        self.score = np.zeros((games, snakes), dtype=np.float64)
+        self.kills = np.zeros((games, snakes), dtype=np.int32)
+        self.gold_count = np.zeros((games, snakes), dtype=np.int32)
+        self.next_move = np.zeros((games, snakes), dtype=np.int8)
+
+        # first deaths, dead snakes keep moving on the board like they do in a real game
+        self.alive = np.ones((games, snakes), dtype=bool)
+        self.death_turn = np.full((games, snakes), -1, dtype=np.int32)
+        self.death_reason = np.zeros((games, snakes), dtype=np.int8)
+        self.killer = np.full((games, snakes), NO_SNAKE, dtype=np.int8)
+
+        self.turn_number = 0
+        self.running = np.ones(games, dtype=bool)
+        self.turns = np.zeros(games, dtype=np.int32)
+
+        self._rows = np.arange(games)
+        self._cache = { } # name -> (turn_number, value), see get_cached
+
+        # games that finished are dropped from the arrays while the rest are still running
+        self.game_ids = np.arange(games)
+        self._finished = None
+
+    @classmethod
+    def from_engines(cls, engines, max_turns=500):
+        # copies the state of reference engines (same size, same rules), used to verify the
+        # vectorized rules against Board.update
+        first = engines[0]
+        snakes = len(first.board.get_snakes())
+        max_length = max([ snake.length for engine in engines for snake_id, snake in engine.board.get_snakes().items() ])
+
+        vector = cls(
+            len(engines),
+            snakes=snakes,
+            width=first.board.width,
+            height=first.board.height,
+            rules=first.game,
+            max_turns=max_turns,
+            max_length=max_length
+        )
+
+        vector.turn_number = first.turn_number
+
+        for game, engine in enumerate(engines):
+            for index, (snake_id, snake) in enumerate(engine.board.get_snakes().items()):
+                vector.length[game, index] = 0
+                vector.occupancy[game, index] = 0
+
+                for x, y in reversed(list(snake.get_positions())):
+                    vector._push_head(np.array([game]), index, np.array([x]), np.array([y]))
+
+                vector.health[game, index] = snake.health
+                vector.score[game, index] = snake.score
+                vector.kills[game, index] = snake.kills
+                vector.gold_count[game, index] = snake.gold
+                vector.next_move[game, index] = MOVE_INDEX[snake.next_move]
+
+                death = engine.deaths.get(snake_id)
+
+                if death:
+                    snake_ids = list(engine.board.get_snakes().keys())
+
+                    vector.alive[game, index] = False
+                    vector.death_turn[game, index] = death["turn"]
+                    vector.death_reason[game, index] = DEATH_REASONS.index(death["reason"])
+                    vector.killer[game, index] = snake_ids.index(death["killer"]) if death["killer"] else NO_SNAKE
+
+            vector.load_items(game, engine.board)
+
+        return vector
+
+    def load_items(self, game, board):
+        for grid, things in [(self.food, board.get_food()), (self.gold, board.get_gold()), (self.walls, board.get_walls())]:
+            grid[game] = False
+
+            for thing in things:
+                grid[game, thing["y"], thing["x"]] = True
+
+    def reset(self):
+        # heads on distinct random cells, the body starts stacked on the head
+        cells = self.random.rand(self.games, self.height * self.width).argsort(axis=1)[:, :self.snakes]
+        heads_x = (cells % self.width).astype(np.int16)
+        heads_y = (cells // self.width).astype(np.int16)
+
+        for index in range(0, self.snakes):
+            for _ in range(0, 3):
+                self._push_head(self._rows, index, heads_x[:, index], heads_y[:, index])
+
+        for _ in range(0, self.rules["boardFoodCount"]):
+            self.spawn_items(self.food, self.running)
+
+        if self.rules["boardHasGold"]:
+            for _ in range(0, self.rules["boardGoldCount"]):
+                self.spawn_items(self.gold, self.running)
+
+    def compact(self):
+        # the arrays only keep the games still running, the final state of the others is
+        # kept aside until restore. a long game doesn't make every turn cost as much as the first
+        finished = ~self.running
+        if not finished.any(): return
+
+        if self._finished is None:
+            self._finished = { name: np.empty_like(getattr(self, name)) for name in GAME_FIELDS }
+
+        for name in GAME_FIELDS:
+            value = getattr(self, name)
+
+            self._finished[name][self.game_ids[finished]] = value[finished]
+            setattr(self, name, value[~finished])
+
+        self.game_ids = self.game_ids[~finished]
+        self.games = len(self.game_ids)
+        self._rows = np.arange(self.games)
+        self._cache = { }
+
+    def restore(self):
+        if self._finished is None: return
+
+        for name in GAME_FIELDS:
+            self._finished[name][self.game_ids] = getattr(self, name)
+            setattr(self, name, self._finished[name])
+
+        self.games = len(self.running)
+        self.game_ids = np.arange(self.games)
+        self._rows = np.arange(self.games)
+        self._cache = { }
+        self._finished = None
+
+    def get_cached(self, name):
+        # values derived from the board that stay the same for the rest of the turn
+        turn_number, value = self._cache.get(name, (None, None))
+        return value if turn_number == self.turn_number else None
+
+    def set_cached(self, name, value):
+        self._cache[name] = (self.turn_number, value)
+        return value
+
+    def get_empty(self):
+        return ~(self.occupancy.any(axis=1) | self.food | self.gold | self.walls)
+
+    def get_finished(self):
+        if self.turn_number >= self.max_turns: return np.ones(self.games, dtype=bool)
+
+        finished = self.alive.sum(axis=1) <= (1 if self.snakes > 1 else 0)
+
+        if self.rules["turnLimit"] and self.turn_number >= self.rules["turnLimit"]:
+            finished[:] = True
+
+        if self.rules["boardHasGold"]:
+            finished |= (self.gold_count >= self.rules["boardGoldWinningThreshold"]).any(axis=1)
+
+        return finished
+
+    def get_heads(self):
+        rows = self._rows[:, None]
+        columns = np.arange(self.snakes)[None, :]
+
+        return self.body_x[rows, columns, self.head], self.body_y[rows, columns, self.head]
+
+    def get_body(self, game, index):
+        positions = (self.head[game, index] + np.arange(self.length[game, index])) % self.capacity
+        return list(zip(self.body_x[game, index, positions].tolist(), self.body_y[game, index, positions].tolist()))
+
+    def get_winners(self):
+        # same as Engine.get_result: the last snake standing, or the last to die if nobody is
+        winners = np.full(self.games, NO_SNAKE, dtype=np.int8)
+
+        alive_count = self.alive.sum(axis=1)
+        winners[alive_count == 1] = self.alive[alive_count == 1].argmax(axis=1)
+
+        everybody_died = alive_count == 0
+        last_turn = self.death_turn.max(axis=1, keepdims=True)
+        last = self.death_turn == last_turn
+        unique = everybody_died & (last.sum(axis=1) == 1)
+        winners[unique] = last[unique].argmax(axis=1)
+
+        if self.rules["boardHasGold"]:
+            gold_winners = self.gold_count >= self.rules["boardGoldWinningThreshold"]
+            unique = gold_winners.sum(axis=1) == 1
+            winners[unique] = gold_winners[unique].argmax(axis=1)
+
+        return winners
+
+    def run(self, policies):
+        # policies: one callable per snake index, (engine, index) -> moves for every game
+        while self.running.any():
+            moves = np.stack([ policy(self, index) for index, policy in enumerate(policies) ], axis=1)
+            self.step(moves)
+
+            if self.running.sum() < self.games // 2: self.compact()
+
+        self.restore()
+
+    def spawn_items(self, grid, games):
+        # one item on a random empty cell of each of `games` (where there is one)
+        empty = self.get_empty().reshape(self.games, -1)
+        weights = self.random.rand(self.games, self.height * self.width)
+        weights[~empty] = -1
+
+        cells = weights.argmax(axis=1)
+        spawn = games & empty.any(axis=1)
+
+        grid[spawn, cells[spawn] // self.width, cells[spawn] % self.width] = True
+
+    def step(self, moves=None):
+        if moves is not None:
+            # bots are only asked for the moves of snakes that are still alive
+            self.next_move = np.where(self.alive, moves, self.next_move).astype(np.int8)
+
+        self.update()
+
+        # top up the food, one at a time like spawn_food_by_strat
+        self.spawn_items(self.food, self.running & (self.food.sum(axis=(1, 2)) < self.rules["boardFoodCount"]))
+
+        self.turn_number = self.turn_number + 1
+
+        finished = self.running & self.get_finished()
+        self.turns[finished] = self.turn_number
+        self.running = self.running & ~finished
+
+    def update(self):
+        # Board.update / Board.resolve_moves: every head moves, snakes that landed on an empty
+        # cell move their tail, heads are checked against the other bodies and heads, then
+        # whoever didn't hit a snake takes what's on its cell
+        moved = self.running[:, None] & (self.length > 0)
+
+        for index in range(0, self.snakes):
+            games = self._rows[moved[:, index]]
+
+            head = self.head[games, index]
+            move = self.next_move[games, index]
+
+            self._push_head(
+                games,
+                index,
+                self.body_x[games, index, head] + MOVE_DX[move],
+                self.body_y[games, index, head] + MOVE_DY[move]
+            )
+
+        heads_x, heads_y = self.get_heads()
+        heads_x, heads_y = heads_x.astype(np.intp), heads_y.astype(np.intp)
+
+        in_bounds = moved & (heads_x >= 0) & (heads_x < self.width) & (heads_y >= 0) & (heads_y < self.height)
+        cells = [ ]
+
+        for index in range(0, self.snakes):
+            games = self._rows[moved[:, index] & ~in_bounds[:, index]]
+            self._kill(games, index, DEATH_OOB)
+
+            games = self._rows[in_bounds[:, index]]
+            x, y = heads_x[games, index], heads_y[games, index]
+
+            on_food = self.food[games, y, x]
+            on_gold = ~on_food & self.gold[games, y, x]
+            on_wall = ~on_food & ~on_gold & self.walls[games, y, x]
+            on_empty = ~on_food & ~on_gold & ~on_wall
+
+            cells.append((games, x, y, on_food, on_gold, on_wall, on_empty))
+
+        if not self.rules["pinTail"]:
+            for index, (games, x, y, on_food, on_gold, on_wall, on_empty) in enumerate(cells):
+                self._pop_tail(games[on_empty], index)
+
+        clear = [ ]
+
+        for index, (games, x, y, on_food, on_gold, on_wall, on_empty) in enumerate(cells):
+            # (games, snakes) other snakes with a segment besides their head on this head's cell
+            own_head = in_bounds[games] & (heads_x[games] == x[:, None]) & (heads_y[games] == y[:, None])
+            bodies = self.occupancy[games, :, y, x] > own_head
+            bodies[:, index] = False
+
+            other_heads = own_head.copy()
+            other_heads[:, index] = False
+
+            on_body = bodies.any(axis=1)
+            self._kill(games[on_body], index, DEATH_COLLISION, bodies[on_body].argmax(axis=1))
+
+            head_to_head = ~on_body & other_heads.any(axis=1)
+
+            if head_to_head.any():
+                h2h_games, h2h_heads = games[head_to_head], other_heads[head_to_head]
+                other_lengths = np.where(h2h_heads, self.length[h2h_games], -1)
+                longest = other_lengths.max(axis=1)
+
+                won = self.length[h2h_games, index] > longest
+                self.score[h2h_games[won], index] += h2h_heads[won].sum(axis=1)
+
+                lost = ~won
+                killers = (other_lengths[lost] == longest[lost, None]).argmax(axis=1)
+
+                self._kill(h2h_games[lost], index, DEATH_KILLED, killers)
+                np.add.at(self.kills, (h2h_games[lost], killers), 1)
+
+            clear.append(~on_body & ~head_to_head)
+
+        for index, (games, x, y, on_food, on_gold, on_wall, on_empty) in enumerate(cells):
+            on_food, on_gold, on_wall, on_empty = [ mask & clear[index] for mask in [on_food, on_gold, on_wall, on_empty] ]
+
+            self.health[games[on_food], index] = 100
+            self.food[games[on_food], y[on_food], x[on_food]] = False
+
+            self.score[games[on_gold], index] += 5
+            self.gold_count[games[on_gold], index] += 1
+            self.gold[games[on_gold], y[on_gold], x[on_gold]] = False
+
+            self._kill(games[on_wall], index, DEATH_WALL)
+
+            self.score[games[on_empty], index] += 0.1
+
+    def _kill(self, games, index, reason, killers=None):
+        self.health[games, index] = 0
+
+        first_death = self.alive[games, index]
+        first = games[first_death]
+
+        self.alive[first, index] = False
+        self.death_turn[first, index] = self.turn_number
+        self.death_reason[first, index] = reason
+
+        if killers is not None: self.killer[first, index] = killers[first_death]
+
+    def _pop_tail(self, games, index):
+        tail = (self.head[games, index] + self.length[games, index] - 1) % self.capacity
+        x = self.body_x[games, index, tail]
+        y = self.body_y[games, index, tail]
+
+        self.length[games, index] -= 1
+
+        in_bounds = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        self.occupancy[games[in_bounds], index, y[in_bounds], x[in_bounds]] -= 1
+
+    def _push_head(self, games, index, x, y):
+        head = (self.head[games, index] - 1) % self.capacity
+
+        self.head[games, index] = head
+        self.body_x[games, index, head] = x
+        self.body_y[games, index, head] = y
+        self.length[games, index] += 1
+
+        in_bounds = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        self.occupancy[games[in_bounds], index, y[in_bounds], x[in_bounds]] += 1
+
+
+def get_safe_moves(engine):
+    # (games, snakes, move) true where the move doesn't hit a wall, a snake or the edge, along
+    # with the cells each move leads to. the same for every policy in a turn
+    cached = engine.get_cached("safe_moves")
+    if cached is not None: return cached
+
+    heads_x, heads_y = engine.get_heads()
+
+    x = heads_x[:, :, None] + MOVE_DX[None, None, :]
+    y = heads_y[:, :, None] + MOVE_DY[None, None, :]
+
+    in_bounds = (x >= 0) & (x < engine.width) & (y >= 0) & (y < engine.height)
+    x, y = np.clip(x, 0, engine.width - 1), np.clip(y, 0, engine.height - 1)
+
+    blocked = engine.occupancy.any(axis=1) | engine.walls
+    rows = engine._rows[:, None, None]
+
+    return engine.set_cached("safe_moves", (in_bounds & ~blocked[rows, y, x], x, y))
+
+
+def get_food_distance(engine):
+    # (games, snakes, move) manhattan distance from where each move leads to the closest food
+    cached = engine.get_cached("food_distance")
+    if cached is not None: return cached
+
+    safe, x, y = get_safe_moves(engine)
+
+    # food positions packed into (games, most food on any board), padded far off the board
+    counts = engine.food.sum(axis=(1, 2))
+    games, food_y, food_x = np.nonzero(engine.food)
+    slots = np.arange(len(games)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    far = 2 * (engine.width + engine.height)
+    positions_x = np.full((engine.games, max(counts.max(), 1)), far, dtype=np.int32)
+    positions_y = np.full((engine.games, max(counts.max(), 1)), far, dtype=np.int32)
+    positions_x[games, slots] = food_x
+    positions_y[games, slots] = food_y
+
+    distance = (
+        np.abs(x[:, :, :, None] - positions_x[:, None, None, :]) +
+        np.abs(y[:, :, :, None] - positions_y[:, None, None, :])
+    ).min(axis=3)
+
+    return engine.set_cached("food_distance", distance)
+
+
+def random_policy(engine, index):
+    safe, x, y = get_safe_moves(engine)
+    weights = engine.random.rand(engine.games, 4) + safe[:, index]
+
+    return weights.argmax(axis=1)
+
+
+def greedy_policy(engine, index):
+    safe, x, y = get_safe_moves(engine)
+    distance = get_food_distance(engine)
+
+    cost = distance[:, index] + engine.random.rand(engine.games, 4) * 0.5
+    cost[~safe[:, index]] = 1000 + engine.random.rand((~safe[:, index]).sum())
+
+    return cost.argmin(axis=1)
+
+
+POLICIES = {
+    "greedy": greedy_policy,
+    "random": random_policy
+}
+
+
+def verify(games=100, turns=200, snakes=4, width=11, height=11, rules=None, bots="greedy,random", seed=0):
+    # runs reference Engines in lockstep with a VectorEngine loaded from them. each turn the
+    # vector engine gets the moves the reference bots made, then snakes, scores and first
+    # deaths are compared and food the reference spawned is copied over
+    random.seed(seed)
+    bot_names = bots.split(",")
+
+    engines = [
+        Engine({
+            "{}-{}".format(bot_names[index % len(bot_names)], index): BOTS[bot_names[index % len(bot_names)]]
+            for index in range(0, snakes)
+        }, width=width, height=height, rules=rules)
+        for _ in range(0, games)
+    ]
+
+    vector = VectorEngine.from_engines(engines, max_turns=turns)
+    mismatches = []
+    compared = 0
+
+    for _ in range(0, turns):
+        if not vector.running.any(): break
+
+        moves = np.array(vector.next_move)
+
+        for game, engine in enumerate(engines):
+            if not vector.running[game]: continue
+
+            if engine.is_finished():
+                vector.running[game] = False
+                continue
+
+            engine.step()
+            moves[game] = [ MOVE_INDEX[snake.next_move] for snake_id, snake in engine.board.get_snakes().items() ]
+
+        vector.next_move = moves
+        vector.update()
+
+        for game, engine in enumerate(engines):
+            if not vector.running[game]: continue
+
+            compared = compared + 1
+            mismatches.extend(compare(vector, game, engine))
+
+            vector.load_items(game, engine.board)
+
+        vector.turn_number = vector.turn_number + 1
+
+    return { "games": games, "turns_compared": compared, "mismatches": mismatches }
+
+
+def compare(vector, game, engine):
+    mismatches = []
+    snake_ids = list(engine.board.get_snakes().keys())
+
+    def mismatch(what, expected, actual):
+        mismatches.append("game {} turn {}: {} expected {} got {}".format(game, engine.turn_number, what, expected, actual))
+
+    for index, (snake_id, snake) in enumerate(engine.board.get_snakes().items()):
+        body = list(snake.get_positions())
+
+        if vector.get_body(game, index) != body: mismatch("{} body".format(snake_id), body, vector.get_body(game, index))
+        if vector.health[game, index] != snake.health: mismatch("{} health".format(snake_id), snake.health, vector.health[game, index])
+        if vector.score[game, index] != snake.score: mismatch("{} score".format(snake_id), snake.score, vector.score[game, index])
+        if vector.kills[game, index] != snake.kills: mismatch("{} kills".format(snake_id), snake.kills, vector.kills[game, index])
+        if vector.gold_count[game, index] != snake.gold: mismatch("{} gold".format(snake_id), snake.gold, vector.gold_count[game, index])
+
+        death = engine.deaths.get(snake_id)
+        vector_death = None
+
+        if not vector.alive[game, index]:
+            killer = vector.killer[game, index]
+
+            vector_death = {
+                "turn": int(vector.death_turn[game, index]),
+                "reason": DEATH_REASONS[vector.death_reason[game, index]],
+                "killer": snake_ids[killer] if killer != NO_SNAKE else None
+            }
+
+        if death != vector_death: mismatch("{} death".format(snake_id), death, vector_death)
+
+    # food can only have been eaten, the reference may have spawned more since
+    food = set([ (food["x"], food["y"]) for food in engine.board.get_food() ])
+    vector_food = set([ (x, y) for y, x in zip(*np.nonzero(vector.food[game])) ])
+
+    if not vector_food <= food: mismatch("food", food, vector_food)
+
+    return mismatches
@@ -0,0 +1,90 @@
+from threading import Lock
+
+from . import app
+
+# raises game:max_viewer_count to the peak seen since the last sync without a read/write race
+# KEYS[1] viewer count, KEYS[2] max viewer count, ARGV[1] viewer count, ARGV[2] peak
+SYNC_VIEWER_COUNT_SCRIPT = """
+redis.call("SET", KEYS[1], ARGV[1])
+
+local max_viewer_count = tonumber(redis.call("GET", KEYS[2]) or "0")
+
+if tonumber(ARGV[2]) > max_viewer_count then
+    redis.call("SET", KEYS[2], ARGV[2])
+end
+"""
+
+
+class ViewerCounts(object):
+    # viewer counts live in process (games know who's watching them), redis only gets a copy
+    # of the counts that changed, in a single pipeline every `sync_interval` seconds
+    def __init__(self, redis, scheduler, sync_interval=1):
+        self.redis = redis
+        self.scheduler = scheduler
+        self.sync_interval = sync_interval
+
+        self.counts = { } # game_id -> viewers
+        self.peaks = { } # game_id -> most viewers since the last sync
+        self.changed = set()
+        self.removed = set() # dropped after their last count is synced
+
+        self._lock = Lock()
+        self._sync_viewer_count = redis.register_script(SYNC_VIEWER_COUNT_SCRIPT)
+
+        self.syncs = 0
+
+    def get(self, game_id):
+        return self.counts.get(game_id, 0)
+
+    def set(self, game_id, count):
+        with self._lock:
+            self.counts[game_id] = count
+            self.peaks[game_id] = max(self.peaks.get(game_id, 0), count)
+            self.changed.add(game_id)
+            self.removed.discard(game_id)
+
+    def remove(self, game_id):
+        # call once the game stopped or left the manager, a game that comes back sets its count again
+        with self._lock:
+            if game_id in self.counts: self.removed.add(game_id)
+
+    def start(self):
+        self.scheduler.call_later(self.sync_interval, self.sync)
+
+    def sync(self):
+        with self._lock:
+            changed = { game_id: (self.counts[game_id], self.peaks.pop(game_id, 0)) for game_id in self.changed }
+            self.changed = set()
+
+            for game_id in self.removed:
+                self.counts.pop(game_id, None)
+                self.peaks.pop(game_id, None)
+
+            removed, self.removed = self.removed, set()
+
+        try:
+            if changed:
+                pipe = self.redis.pipeline(transaction=False)
+
+                for game_id, (count, peak) in changed.items():
+                    self._sync_viewer_count(
+                        keys=["game:viewer_count:{}".format(game_id), "game:max_viewer_count:{}".format(game_id)],
+                        args=[count, peak],
+                        client=pipe
+                    )
+
+                pipe.execute()
+                self.syncs = self.syncs + 1
+        except Exception as error:
+            app.logger.error("failed to sync %d viewer counts: %s", len(changed), error)
+
+            # try again next time, keeping the highest peak
+            with self._lock:
+                for game_id, (count, peak) in changed.items():
+                    self.counts.setdefault(game_id, count)
+                    self.peaks[game_id] = max(self.peaks.get(game_id, 0), peak)
+                    self.changed.add(game_id)
+
+                    if game_id in removed: self.removed.add(game_id)
+        finally:
+            self.start()
@@ -0,0 +1,10 @@
+-- turns written by saas/history.py, one compressed board per game turn. the rest of the
+-- schema is owned by the api's migrations, apply this alongside them
+
+CREATE TABLE IF NOT EXISTS "public"."GameTurns" (
+    "GameId" UUID NOT NULL,
+    "turn" INTEGER NOT NULL,
+    "board" BYTEA NOT NULL,
+    "createdAt" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    PRIMARY KEY ("GameId", "turn")
+);
@@ -0,0 +1,157 @@
+import argparse
+import os
+import random
+import time
+
+from collections import Counter
+
+# keeps saas/__init__.py from setting up flask, postgres, redis...
+os.environ["HEADLESS"] = "1"
+
+from saas.engine import BOTS, Engine
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="run seeded headless games and report engine throughput")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--snakes", type=int, default=4)
+    parser.add_argument("--width", type=int, default=11)
+    parser.add_argument("--height", type=int, default=11)
+    parser.add_argument("--food", type=int, default=4)
+    parser.add_argument("--turn-limit", type=int, default=500)
+    parser.add_argument("--pin-tail", action="store_true")
+    parser.add_argument("--bots", default="greedy,random", help="comma separated, assigned to snakes round robin ({})".format(", ".join(BOTS)))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--vector", action="store_true", help="run every game at once with the numpy engine (saas/vector.py)")
+    parser.add_argument("--verify", action="store_true", help="check the numpy engine against Board.update instead")
+
+    return parser.parse_args()
+
+
+def get_snake_name(bot_names, index):
+    return "{}-{}".format(bot_names[index % len(bot_names)], index)
+
+
+def main():
+    args = parse_args()
+    bot_names = args.bots.split(",")
+
+    for bot_name in bot_names:
+        if bot_name not in BOTS: raise SystemExit("unknown bot {}".format(bot_name))
+
+    rules = {
+        "boardFoodCount": args.food,
+        "pinTail": args.pin_tail,
+        "turnLimit": args.turn_limit
+    }
+
+    if args.verify: verify_vector(args, bot_names, rules)
+    elif args.vector: run_vector(args, bot_names, rules)
+    else: run(args, bot_names, rules)
+
+
+def print_stats(games, elapsed, game_lengths, wins, death_reasons, bot_errors=0):
+    turns = sum(game_lengths)
+    game_lengths = sorted(game_lengths)
+
+    print("games         {}".format(games))
+    print("turns         {}".format(turns))
+    print("elapsed       {:.2f}s".format(elapsed))
+    print("turns/s       {:.0f}".format(turns / elapsed if elapsed else 0))
+    print("games/s       {:.1f}".format(games / elapsed if elapsed else 0))
+    print("game length   mean {:.1f}, median {}, max {}".format(
+        turns / games if games else 0,
+        game_lengths[len(game_lengths) // 2] if game_lengths else 0,
+        game_lengths[-1] if game_lengths else 0
+    ))
+    print("wins          {}".format(", ".join([ "{} {}".format(name, count) for name, count in wins.most_common() ])))
+    print("deaths        {}".format(", ".join([ "{} {}".format(reason, count) for reason, count in death_reasons.most_common() ])))
+    print("bot errors    {}".format(bot_errors))
+
+
+def run(args, bot_names, rules):
+    wins = Counter()
+    death_reasons = Counter()
+    game_lengths = []
+    bot_errors = 0
+
+    started_at = time.time()
+
+    for game_number in range(0, args.games):
+        # every game is reproducible from --seed and its number
+        random.seed(args.seed + game_number)
+
+        snake_bots = { get_snake_name(bot_names, index): BOTS[bot_names[index % len(bot_names)]] for index in range(0, args.snakes) }
+
+        engine = Engine(snake_bots, width=args.width, height=args.height, rules=rules, game_id="sim-{}".format(game_number))
+        result = engine.run()
+
+        game_lengths.append(result["turns"])
+        bot_errors = bot_errors + result["bot_errors"]
+
+        wins[result["winner"].rsplit("-", 1)[0] if result["winner"] else "draw"] += 1
+
+        for snake_id, death in result["deaths"].items():
+            death_reasons[death["reason"]] += 1
+
+    print_stats(args.games, time.time() - started_at, game_lengths, wins, death_reasons, bot_errors)
+
+
+def run_vector(args, bot_names, rules):
+    from saas.vector import DEATH_REASONS, NO_SNAKE, POLICIES, VectorEngine
+
+    engine = VectorEngine(
+        args.games,
+        snakes=args.snakes,
+        width=args.width,
+        height=args.height,
+        rules=rules,
+        max_turns=args.turn_limit or 1000,
+        seed=args.seed
+    )
+
+    started_at = time.time()
+
+    engine.reset()
+    engine.run([ POLICIES[bot_names[index % len(bot_names)]] for index in range(0, args.snakes) ])
+
+    elapsed = time.time() - started_at
+
+    wins = Counter([
+        bot_names[winner % len(bot_names)] if winner != NO_SNAKE else "draw"
+        for winner in engine.get_winners().tolist()
+    ])
+
+    death_reasons = Counter([
+        DEATH_REASONS[reason] for reason in engine.death_reason[~engine.alive].tolist()
+    ])
+
+    print_stats(args.games, elapsed, engine.turns.tolist(), wins, death_reasons)
+
+
+def verify_vector(args, bot_names, rules):
+    from saas.vector import verify
+
+    result = verify(
+        games=args.games,
+        turns=args.turn_limit or 1000,
+        snakes=args.snakes,
+        width=args.width,
+        height=args.height,
+        rules=rules,
+        bots=",".join(bot_names),
+        seed=args.seed
+    )
+
+    print("games         {}".format(result["games"]))
+    print("turns checked {}".format(result["turns_compared"]))
+    print("mismatches    {}".format(len(result["mismatches"])))
+
+    for mismatch in result["mismatches"][:20]:
+        print("  {}".format(mismatch))
+
+    if result["mismatches"]: raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
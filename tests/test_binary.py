@@ -0,0 +1,61 @@
+import os
+import unittest
+
+# only the encoder is under test, none of the services need to come up
+os.environ.setdefault("HEADLESS", "1")
+
+from saas.binary import FLAG_LONG_COORDS, FLAG_WIDE_COORDS, FrameDecoder, FrameEncoder
+
+
+def create_frame(coords, turn_number=1):
+    return {
+        "id": "game",
+        "turnNumber": turn_number,
+        "viewers": 1,
+        "daemon": None,
+        "errors": None,
+        "board": {
+            "width": 11,
+            "height": 11,
+            "food": [{ "x": 1, "y": 1 }],
+            "walls": [],
+            "teleporters": [],
+            "snakes": [],
+            "deadSnakes": [{
+                "id": "snake", "name": "snake", "color": "#ffffff", "taunt": "", "error": None,
+                "health": 0, "score": 0.0, "kills": 0, "goldCount": 0,
+                "death": { "turn": 1, "reason": "wall", "killer": None },
+                "coords": [ { "x": x, "y": y, "color": "#ffffff" } for x, y in coords ]
+            }]
+        }
+    }
+
+
+class FrameEncoderTest(unittest.TestCase):
+    def round_trip(self, coords):
+        message = FrameEncoder().encode(create_frame(coords), full_table=True)
+        snake = FrameDecoder().decode(message)["board"]["deadSnakes"][0]
+
+        self.assertEqual([ (coord["x"], coord["y"]) for coord in snake["coords"] ], coords)
+
+        # message flags, magic, version, then the payload flags
+        return message[4]
+
+    def test_narrow_coords(self):
+        self.assertEqual(self.round_trip([(0, 0), (127, -128)]), 0)
+
+    def test_wide_coords(self):
+        self.assertEqual(self.round_trip([(0, 0), (32767, -32768)]), FLAG_WIDE_COORDS)
+
+    def test_long_coords(self):
+        # dead snakes keep moving, in games without a turn limit they drift past 16 bits
+        coords = [(40000, 5), (-2 ** 31, 2 ** 31 - 1)]
+        self.assertEqual(self.round_trip(coords), FLAG_LONG_COORDS)
+
+    def test_long_body(self):
+        coords = [ (index % 11, index // 11) for index in range(0, 70000) ]
+        self.round_trip(coords)
+
+
+if __name__ == "__main__":
+    unittest.main()